@@ -0,0 +1,53 @@
+"""order listing indexes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 09:13:00.147382
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # индексы для keyset выдачи ордеров; на Postgres - CONCURRENTLY,
+    # без блокировки записи в orders
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_orders_order_status_created_at",
+            "orders",
+            ["order_status", "created_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_orders_manager_executive_id_created_at",
+            "orders",
+            ["manager_executive_id", "created_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_orders_manager_executive_id_created_at",
+            table_name="orders",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_orders_order_status_created_at",
+            table_name="orders",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,42 @@
+"""account number sequence
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 09:15:12.204518
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# шаг = размер блока hi-lo; менять через ALTER SEQUENCE ... INCREMENT BY
+account_number_seq = sa.Sequence(
+    "orders_account_number_seq",
+    start=100000000,
+    increment=100,
+    minvalue=100000000,
+    maxvalue=999999999,
+)
+
+
+def upgrade() -> None:
+    # последовательности есть только в Postgres, на остальных БД номер случайный
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(sa.schema.CreateSequence(account_number_seq))
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute(sa.schema.DropSequence(account_number_seq))
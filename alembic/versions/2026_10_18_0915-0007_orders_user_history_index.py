@@ -0,0 +1,41 @@
+"""orders user history index
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 09:15:07.110126
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # история ордеров пользователя, новые сначала; на Postgres - CONCURRENTLY,
+    # без блокировки записи в orders
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_orders_user_id_created_at",
+            "orders",
+            ["user_id", sa.text("created_at DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_orders_user_id_created_at",
+            table_name="orders",
+            postgresql_concurrently=True,
+        )
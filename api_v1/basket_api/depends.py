@@ -1,8 +1,8 @@
 from typing import Annotated
-from fastapi import Depends, Header
+from fastapi import Depends
 
+from api_v1.depends import OptionalPrincipal_Depends, Principal_Depends
 from core.base_UOW import IUnitOfWork, UnitOfWork
 
 
 UOF_Depends = Annotated[IUnitOfWork, Depends(UnitOfWork)]
-Token_Depends = Annotated[str, Header()]
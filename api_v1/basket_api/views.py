@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Header, HTTPException, status
+from typing import Annotated
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.exc import NoResultFound
 
-from api_v1.basket_api.depends import Token_Depends, UOF_Depends
+from api_v1.basket_api.depends import (
+    OptionalPrincipal_Depends,
+    Principal_Depends,
+    UOF_Depends,
+)
 
 # == My
 from basket_app import schemas
 from basket_app.bascket_service import BascketService
+from core import settings
 from core.base_model import TokenSchema
+from core.etag import if_none_match as etag_not_modified
+from core.pagination import CursorPage
 
 router = APIRouter(tags=["Bascket"])
 
@@ -14,13 +24,39 @@ router = APIRouter(tags=["Bascket"])
 # GET ALL       === === === === === === === ===
 @router.get(
     "/",
-    # response_model=list[schemas.BasketPydantic2],
-    summary="Получение списка корзин.",
-    description="Можно получить список всех корзин. А нафиг? Пока пусть будет.",
-    deprecated=True,
+    response_model=CursorPage[schemas.BasketReadPydantic],
+    summary="Получение списка корзин по страницам.",
+    description="""
+        Постраничная выдача корзин по возрастанию id (keyset, без OFFSET).
+        Для следующей страницы передай `cursor` из `next_cursor` предыдущей.
+        `next_cursor = null` - это последняя страница.
+        """,
+)
+async def get_basckets(
+    uow: UOF_Depends,
+    cursor: str | None = None,
+    size: Annotated[
+        int, Query(ge=1, le=settings.basket.max_page_size)
+    ] = settings.basket.page_size,
+):
+    return await BascketService().get_baskets_page(uow=uow, size=size, cursor=cursor)
+
+
+@router.get(
+    "/export/",
+    summary="Выгрузка всех корзин в NDJSON.",
+    description="""
+        Потоковая выгрузка всех корзин: по одной корзине (JSON) на строку.
+        Строки читаются с серверного курсора, память сервиса не растет
+        с размером таблицы.
+        """,
+    response_class=StreamingResponse,
 )
-async def get_basckets(uow: UOF_Depends):
-    return await BascketService().get_baskets(uow)
+async def export_basckets(uow: UOF_Depends):
+    return StreamingResponse(
+        BascketService().export_baskets_ndjson(uow),
+        media_type="application/x-ndjson",
+    )
 
 
 # GET           === === === === === === === ===
@@ -29,19 +65,55 @@ async def get_basckets(uow: UOF_Depends):
     # response_model=schemas.BasketPydantic | schemas.SimpleMSGErrorPydantic,
     summary="Получение экземпляра корзины по uuid_id.",
     description="""Нужен uuid_id для получения экземпляра корзины. 
-                Вернет корзину с completed = False""",
+                Вернет корзину с completed = False.<br>
+                В заголовке `ETag` - версия корзины. Передай ее в `If-None-Match`:
+                если корзина не менялась, вернется `304` без тела.""",
+    responses={304: {"description": "Корзина не изменилась."}},
 )
 async def get_bascket_by_uuid(
     uuid_id: str,
     uow: UOF_Depends,
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
+    service = BascketService()
+    if if_none_match is not None:
+        etag = await service.get_bascket_etag(uow=uow, uuid_id=uuid_id)
+        if etag is not None and etag_not_modified(if_none_match, etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
     try:
-        return await BascketService().get_bascket_by_uuid(uow=uow, uuid_id=uuid_id)
+        basket = await service.get_bascket_by_uuid(uow=uow, uuid_id=uuid_id)
     except NoResultFound as error:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Корзина с UUID {uuid_id!r} не найдена.",
         )
+    if basket is not None:
+        response.headers["ETag"] = service.etag(basket)
+    return basket
+
+
+@router.post(
+    "/batch/",
+    response_model=schemas.BasketBatchResponse,
+    summary="Получение многих корзин по списку uuid_id.",
+    description=f"""
+        Одним запросом вместо N вызовов `/by/{{uuid_id}}/`, до
+        {settings.basket.batch_max_size} uuid_id за раз.
+        Как и там - только корзины с completed = False.
+        Ненайденные uuid_id вернутся в `not_found`.
+        В `fields` можно перечислить нужные поля - остальные не читаются из БД.
+        """,
+)
+async def get_basckets_by_uuids(
+    uow: UOF_Depends,
+    batch_request: schemas.BasketBatchRequest,
+):
+    return await BascketService().get_basckets_by_uuids(
+        uow=uow, uuid_ids=batch_request.uuid_ids, fields=batch_request.fields
+    )
 
 
 @router.get(
@@ -54,14 +126,38 @@ async def get_bascket_by_uuid(
         """,
     deprecated=True,
 )
-async def get_basket_by_access_token(uow: UOF_Depends, access_token: Token_Depends):
-    try:
-        data_token = TokenSchema(access_token=access_token)
-        user_id = data_token.access_token.get("user_id")
-        basket = await BascketService().get_bascket_by_user_id(uow=uow, user_id=user_id)
-        return basket
-    except ValueError:
-        raise HTTPException(400)
+async def get_basket_by_access_token(uow: UOF_Depends, principal: Principal_Depends):
+    return await BascketService().get_bascket_by_user_id(
+        uow=uow, user_id=principal.user_id
+    )
+
+
+@router.get(
+    "/by_product/{prod_id}/",
+    response_model=list[str],
+    summary="uuid_id корзин, в которых лежит продукт.",
+    description="Только незавершенные корзины (completed = False).",
+)
+async def get_basket_uuids_with_product(prod_id: int, uow: UOF_Depends):
+    return await BascketService().get_basket_uuids_with_product(
+        uow=uow, prod_id=prod_id
+    )
+
+
+@router.get(
+    "/reserved/",
+    response_model=dict[int, int],
+    summary="Сколько единиц продуктов лежит в корзинах.",
+    description="""
+        Сумма кол-ва по продуктам во всех незавершенных корзинах.
+        Можно ограничить список продуктов через `prod_ids`.
+        """,
+)
+async def get_reserved_quantity(
+    uow: UOF_Depends,
+    prod_ids: Annotated[list[int] | None, Query()] = None,
+):
+    return await BascketService().get_reserved_quantity(uow=uow, prod_ids=prod_ids)
 
 
 # UPDATE PATCH  === === === === === === === ===
@@ -69,17 +165,31 @@ async def get_basket_by_access_token(uow: UOF_Depends, access_token: Token_Depen
     "/{uuid_id}/",
     response_model=schemas.BasketPydantic,
     summary="Обновит поле корзины.",
-    description="В теле запроса можно указать то поле, которое нужно обновить.",
+    description="""
+        В теле запроса можно указать то поле, которое нужно обновить.
+        С заголовком `If-Match` изменение пройдет, только если корзина
+        не менялась с момента чтения, иначе `412`.
+        """,
+    responses={412: {"description": "Версия корзины не совпала с If-Match."}},
     deprecated=True,
 )
 async def update_bascket(
     uow: UOF_Depends,
     uuid_id: str,
     bascket_update: schemas.BasketPydantic,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
 ):
-    return await BascketService().update_bascket(
-        uow=uow, uuid_id=uuid_id, bascket_update=bascket_update, partial=True
+    service = BascketService()
+    basket = await service.update_bascket(
+        uow=uow,
+        uuid_id=uuid_id,
+        bascket_update=bascket_update,
+        partial=True,
+        if_match=if_match,
     )
+    response.headers["ETag"] = service.etag(basket)
+    return basket
 
 
 @router.patch(
@@ -90,13 +200,24 @@ async def update_bascket(
         Принимает в query uuid_id корзины, который сформировал клиентский код. 
         В теле ожидатеся ключ доступа в котором зашифрован ID пользователя, 
         которым и будет подписана корзина.
+        С заголовком `If-Match` подпись пройдет, только если корзина
+        не менялась с момента чтения, иначе `412`.
         """,
+    responses={412: {"description": "Версия корзины не совпала с If-Match."}},
     deprecated=True,
 )
-async def sign_basket(uow: UOF_Depends, uuid_id: str, access_token: TokenSchema):
-    basket = await BascketService().sign_basket(
-        uow=uow, uuid_id=uuid_id, access_token=access_token
+async def sign_basket(
+    uow: UOF_Depends,
+    uuid_id: str,
+    access_token: TokenSchema,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    service = BascketService()
+    basket = await service.sign_basket(
+        uow=uow, uuid_id=uuid_id, access_token=access_token, if_match=if_match
     )
+    response.headers["ETag"] = service.etag(basket)
     return basket
 
 
@@ -105,11 +226,20 @@ async def sign_basket(uow: UOF_Depends, uuid_id: str, access_token: TokenSchema)
     "/{uuid_id}/",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Удали корзину.",
-    description="Удалит корзину безвозвратно. **`Постарайся не удалять корзины этим способом`**",
+    description="""
+        Удалит корзину безвозвратно. **`Постарайся не удалять корзины этим способом`**
+        С заголовком `If-Match` удаление пройдет, только если корзина
+        не менялась с момента чтения, иначе `412`.
+        """,
+    responses={412: {"description": "Версия корзины не совпала с If-Match."}},
     deprecated=True,
 )
-async def delete_bascket(uow: UOF_Depends, uuid_id: str) -> None:
-    await BascketService().delete_bascket(uow=uow, uuid_id=uuid_id)
+async def delete_bascket(
+    uow: UOF_Depends,
+    uuid_id: str,
+    if_match: Annotated[str | None, Header()] = None,
+) -> None:
+    await BascketService().delete_bascket(uow=uow, uuid_id=uuid_id, if_match=if_match)
 
 
 @router.post(
@@ -120,9 +250,12 @@ async def delete_bascket(uow: UOF_Depends, uuid_id: str) -> None:
     description="""Создаст новую корзину, если она не существует, 
                 или обновит существующию. Из обязательно 'uuid_id' и basket_items 
                 не пустой. Если с товаром идет подарок - то указать как 'gift_prod_id'.
+                С заголовком `If-Match` обновление пройдет, только если корзина
+                не менялась с момента чтения, иначе `412`.
                 """,
     responses={
         404: {"description": "Сам виноват."},
+        412: {"description": "Версия корзины не совпала с If-Match."},
         500: {"description": "Да пошел ты!"},
     },
     response_description="Информация о корзине.",
@@ -131,17 +264,24 @@ async def delete_bascket(uow: UOF_Depends, uuid_id: str) -> None:
 async def create_or_update_basket(
     new_bascket: schemas.BasketPydantic,
     uow: UOF_Depends,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
 ):
+    service = BascketService()
     try:
         uuid_id = new_bascket.uuid_id
-        return await BascketService().create_or_update_bascket(
-            uow=uow, uuid_id=uuid_id, bascket_data=new_bascket
+        basket = await service.create_or_update_bascket(
+            uow=uow, uuid_id=uuid_id, bascket_data=new_bascket, if_match=if_match
         )
+    except HTTPException:
+        raise
     except Exception as error:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Ошибка? -> {error!r}.",
         )
+    response.headers["ETag"] = service.etag(basket)
+    return basket
 
 
 @router.patch(
@@ -154,7 +294,10 @@ async def create_or_update_basket(
                 навигации (какой товар хотим удалить/изменить колличество).
                 В теле указывается поле count - для изменения кол-ва и поле 
                 delete - если истина, то удалит товар с корзины.
+                С заголовком `If-Match` изменение пройдет, только если корзина
+                не менялась с момента чтения, иначе `412`.
                 """,
+    responses={412: {"description": "Версия корзины не совпала с If-Match."}},
     deprecated=True,
 )
 async def basket_item_update(
@@ -162,16 +305,54 @@ async def basket_item_update(
     uuid_id: str,
     product_id: str,
     data_item: schemas.BasketItemUpdate,
+    if_match: Annotated[str | None, Header()] = None,
 ):
     await BascketService().basket_item_update(
         uow,
         uuid_id,
         product_id,
         data_item,
+        if_match=if_match,
     )
     return data_item
 
 
+@router.post(
+    "/{uuid_id}/items/{product_id}/",
+    status_code=status.HTTP_200_OK,
+    # response_model= корзина бывает в обоих форматах basket_items
+    summary="Изменить одну позицию корзины.",
+    description="""
+                Точечное изменение позиции без пересборки всей корзины:
+                `INCREMENT` - изменить кол-во на `value` (можно отрицательное),
+                `SET` - установить кол-во `value`, `REMOVE` - удалить позицию.
+                Если кол-во стало <= 0 - позиция удаляется.
+                В магазин за деталями идем только если продукта еще нет в корзине.
+                С заголовком `If-Match` изменение пройдет, только если корзина
+                не менялась с момента чтения, иначе `412`.
+                """,
+    responses={412: {"description": "Версия корзины не совпала с If-Match."}},
+)
+async def basket_item_operation(
+    uow: UOF_Depends,
+    uuid_id: str,
+    product_id: int,
+    item_operation: schemas.BasketItemOperation,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    service = BascketService()
+    basket = await service.apply_item_operation(
+        uow=uow,
+        uuid_id=uuid_id,
+        product_id=product_id,
+        item_operation=item_operation,
+        if_match=if_match,
+    )
+    response.headers["ETag"] = service.etag(basket)
+    return basket
+
+
 @router.post(
     "/update_or_create/",
     summary="Создай и получи корзину.",
@@ -181,19 +362,34 @@ async def basket_item_update(
         В общем, для создании корзины нужно только `uuid_id` и всё..<br>
         Но если у тебя есть `JWT` (причем подойдет даже refresh), что значит, что пользователь идентифицирован, тогда предоставь его. 
         Этим можно сразу и **подписать** корзину за определенным пользователем.<br>
-        В поле `basket_items` добавляй ID товаров (int).<br><hr>
+        Вместо `user_id` в теле можно передать access ключ в заголовке `access-token`.<br>
+        В поле `basket_items` передавай состав корзины в виде `{ID товара: кол-во}`.<br><hr>
         <h2>Предположительные вопросы???</h2>
         **Как добавить несколько товаров с одним ID?**<br>
-        - Просто добавь и добейся списка такго вида [76, 76, 76, 34, 76, 34, 55] - где 76 встречается
-        4 раза, 34 - 2 раза, а 55 - 1 раз.<br>
-        *Если такой вариант не удобен или не нравится, можем `обсудить`.*
+        - Укажи кол-во: `{"76": 4, "34": 2, "55": 1}` - 76 в кол-ве 4 шт., 34 - 2 шт., 55 - 1 шт.<br>
+        - Старый формат - список с повторами [76, 76, 76, 34, 76, 34, 55] - тоже принимается
+        и сохраняется в компактном виде.<br>
+        **Как не затереть чужие изменения?**<br>
+        - Передай `ETag` из последнего чтения в `If-Match`. Если корзина за это время
+        изменилась - вернется `412`, перечитай ее и повтори.
     """,
+    responses={412: {"description": "Версия корзины не совпала с If-Match."}},
 )
 async def update_or_create_basket(
     new_bascket: schemas.BasketPydantic2,
     uow: UOF_Depends,
+    response: Response,
+    principal: OptionalPrincipal_Depends,
+    if_match: Annotated[str | None, Header()] = None,
 ):
     uuid_id = new_bascket.uuid_id
-    return await BascketService().create_or_update_bascket_2(
-        uow=uow, uuid_id=uuid_id, bascket_data=new_bascket
+    service = BascketService()
+    basket = await service.create_or_update_bascket_2(
+        uow=uow,
+        uuid_id=uuid_id,
+        bascket_data=new_bascket,
+        if_match=if_match,
+        principal=principal,
     )
+    response.headers["ETag"] = service.etag(basket)
+    return basket
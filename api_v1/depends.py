@@ -0,0 +1,36 @@
+from typing import Annotated
+
+from fastapi import Depends, Header, HTTPException, Request, status
+
+from core.auth import Principal, decode_principal
+
+
+async def get_principal(
+    request: Request,
+    access_token: Annotated[str | None, Header()] = None,
+) -> Principal | None:
+    # ключ разбирается один раз за запрос, результат - в request.state.principal;
+    # без заголовка (аноним) ничего не делаем
+    if access_token is None:
+        return None
+    if getattr(request.state, "principal", None) is None:
+        try:
+            request.state.principal = decode_principal(access_token)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return request.state.principal
+
+
+async def require_principal(
+    principal: Annotated[Principal | None, Depends(get_principal)],
+) -> Principal:
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Нужен ключ доступа (заголовок access-token).",
+        )
+    return principal
+
+
+OptionalPrincipal_Depends = Annotated[Principal | None, Depends(get_principal)]
+Principal_Depends = Annotated[Principal, Depends(require_principal)]
@@ -1,10 +1,8 @@
-from fastapi import Depends, Header
+from fastapi import Depends
 from typing import Annotated
-from fastapi_pagination import Params
 
+from api_v1.depends import OptionalPrincipal_Depends, Principal_Depends
 from core.base_UOW import IUnitOfWork, UnitOfWork
 
 
 UOF_Depends = Annotated[IUnitOfWork, Depends(UnitOfWork)]
-Params_Depends = Annotated[Params, Depends(Params)]
-Token_Depends = Annotated[str, Header()]
@@ -1,17 +1,24 @@
-from fastapi_pagination import Page
-from fastapi import APIRouter, HTTPException, status
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query, status
 
 from sqlalchemy.exc import NoResultFound
 
 # == My
 from order_app.order_service import OrdertService
-from api_v1.order_api.depends import UOF_Depends, Params_Depends, Token_Depends
+from api_v1.order_api.depends import UOF_Depends, Principal_Depends
+from core.pagination import CountMode, CursorPage
+from core.settings import settings
 from order_app.schemas import (
     OrderCreateSchema,
+    OrderInclude,
     OrderPydantic,
     OrderStatusType,
+    OrderSummaryPydantic,
+    OrderWithBasketPydantic,
+    PaymentLinkPydantic,
+    QuotePydantic,
     ReadOrderPydantic,
-    TokenSchema,
 )
 
 
@@ -41,41 +48,87 @@ async def create_order(
     return link
 
 
+# GET           === === === === === === === ===
+@router.get(
+    "/quote/{uuid_id}/",
+    response_model=QuotePydantic,
+    summary="Расчет стоимости корзины для города доставки.",
+    description="""
+    Цена и сумма по каждой позиции и итог - та же сумма, что попадет в ордер.
+    `missing` - продукты, которых магазин не вернул для этого города (в итог не входят).
+    """,
+)
+async def get_quote(uuid_id: str, shipping_city: str, uow: UOF_Depends):
+    return await OrdertService().get_quote(
+        uow=uow, uuid_id=uuid_id, shipping_city=shipping_city
+    )
+
+
+@router.get(
+    "/payment_link/{uuid_id}/",
+    response_model=PaymentLinkPydantic,
+    summary="Платежная ссылка последнего ордера корзины.",
+    description="""
+    Ссылку на оплату получает фоновый диспетчер, уже после создания ордера.
+    Если при создании ордера банк не успел ответить - ссылку можно забрать здесь.
+    `wait` - сколько секунд подождать ссылку (long-poll), 0 - ответить сразу.
+    `ready=false` - ссылки пока нет.
+    """,
+)
+async def get_payment_link(
+    uuid_id: str,
+    uow: UOF_Depends,
+    wait: float = Query(default=0, ge=0, le=30),
+):
+    return await OrdertService().get_payment_link(uow=uow, uuid_id=uuid_id, wait=wait)
+
+
 # GET ALL WITH PAGINATED    === === === === ===
 @router.get(
     "/all/",
-    response_model=Page[OrderPydantic],
+    response_model=CursorPage[OrderPydantic],
     summary="Получение всех ордеров с пагинацией.",
     description="""
-    Данный endpoint возвращает список ордеров с пагинацией. 
-    Можно не переживать о расходе памяти, так как мы не выгружаем из БД
-    все ордера в память устройства. Вместо этого оно выполняет SQL-запрос, 
-    который включает в себя LIMIT и OFFSET, чтобы получить только нужные 
-    записи для конкретной страницы. 
+    Постраничная выдача ордеров со статусом `order_status` в порядке создания
+    (keyset по created_at и id, без OFFSET): глубина страницы на скорость не влияет.
+    Для следующей страницы передай `cursor` из `next_cursor` предыдущей.
+    `next_cursor = null` - это последняя страница.
+    `count` - нужен ли `total`: EXACT - точный COUNT(*), APPROXIMATE - из кэша
+    (может отставать на ORDER_COUNT_CACHE_TTL секунд), NONE - без total.
     """,
 )
 async def get_orders(
     uow: UOF_Depends,
-    params: Params_Depends,
     order_status: OrderStatusType = OrderStatusType.NEW,
+    cursor: str | None = None,
+    size: Annotated[
+        int, Query(ge=1, le=settings.order.max_page_size)
+    ] = settings.order.page_size,
+    count: CountMode = CountMode.NONE,
 ):
-    return await OrdertService().get_paginated_orders(uow, params, order_status)
+    return await OrdertService().get_paginated_orders(
+        uow=uow, size=size, order_status=order_status, cursor=cursor, count=count
+    )
 
 
 # GET           === === === === === === === ===
 @router.get(
     "/info_with_basket/{uuid_id}/",
-    # response_model=
+    response_model=OrderWithBasketPydantic,
     summary="Получение экземпляра ордера по uuid_id с детальной информацией о корзине.",
-    # description=
+    description="""
+    Ордер и корзина без состава. Состав корзины (`basket_items`, `gift_items`) -
+    только с `include=basket_items`. Если ордеров на корзину несколько - последний.
+    """,
 )
 async def get_info_order_with_basket(
     uuid_id: str,
     uow: UOF_Depends,
+    include: OrderInclude | None = None,
 ):
     try:
         return await OrdertService().get_info_order_with_basket(
-            uow=uow, uuid_id=uuid_id
+            uow=uow, uuid_id=uuid_id, include=include
         )
     except NoResultFound as error:
         raise HTTPException(
@@ -87,37 +140,68 @@ async def get_info_order_with_basket(
 # GET           === === === === === === === ===
 @router.get(
     "/by_access_t/",
-    # response_model=,
+    response_model=CursorPage[OrderSummaryPydantic],
     summary="Получение экземпляров ордеров через haeders access_token.",
     description="""
         Нужен валидный ключ.
-        Вернет список ордеров пользователя.
+        Вернет ордера пользователя постранично, новые сначала: краткая
+        сводка без комментария, адреса и данных менеджера.
+        Для следующей страницы передай `cursor` из `next_cursor` предыдущей.
+        Полный ордер - /by_access_t/{order_id}/.
         """,
 )
-async def get_order_by_access_token(uow: UOF_Depends, access_token: Token_Depends):
-    try:
-        data_token = TokenSchema(access_token=access_token)
-        user_id = data_token.access_token.get("user_id")
-        orders = await OrdertService().get_orders_by_user_id(uow=uow, user_id=user_id)
-        return orders
-    except ValueError:
-        raise HTTPException(400)
+async def get_order_by_access_token(
+    uow: UOF_Depends,
+    principal: Principal_Depends,
+    cursor: str | None = None,
+    size: Annotated[
+        int, Query(ge=1, le=settings.order.max_page_size)
+    ] = settings.order.page_size,
+):
+    return await OrdertService().get_orders_by_user_id(
+        uow=uow, user_id=principal.user_id, size=size, cursor=cursor
+    )
+
+
+@router.get(
+    "/by_access_t/{order_id}/",
+    response_model=ReadOrderPydantic,
+    summary="Полный ордер пользователя через haeders access_token.",
+    description="""
+        Нужен валидный ключ. Только ордера этого пользователя.
+        """,
+)
+async def get_user_order_by_access_token(
+    order_id: int, uow: UOF_Depends, principal: Principal_Depends
+):
+    return await OrdertService().get_user_order(
+        uow=uow, user_id=principal.user_id, order_id=order_id
+    )
 
 
 # GET ALL WITH PAGINATED AND FILTERING executive_id ===
 @router.get(
     "/get_manager_order_archive/{manager_executive_id}/",
-    response_model=Page[ReadOrderPydantic],
+    response_model=CursorPage[ReadOrderPydantic],
     summary="Получение ордеров, которые менеджер уже принял в обработку (!=NEW).",
     description="""Нужен manager_executive_id для получения ордеров, 
                 с которыми менеджер работал ранее. Принимал или отклонял - 
-                все ордера с которыми он взаимодействовал.""",
+                все ордера с которыми он взаимодействовал.
+                Страницы - по `cursor` из `next_cursor`, `count` - как в /all/.""",
 )
 async def get_manager_order_archive(
     manager_executive_id: str,
-    params: Params_Depends,
     uow: UOF_Depends,
+    cursor: str | None = None,
+    size: Annotated[
+        int, Query(ge=1, le=settings.order.max_page_size)
+    ] = settings.order.page_size,
+    count: CountMode = CountMode.NONE,
 ):
     return await OrdertService().get_paginated_orders_by_filters(
-        uow=uow, params=params, manager_executive_id=manager_executive_id
+        uow=uow,
+        size=size,
+        cursor=cursor,
+        count=count,
+        manager_executive_id=manager_executive_id,
     )
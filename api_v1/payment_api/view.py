@@ -20,6 +20,7 @@ router = APIRouter(tags=["Payment"])
     совершает обратный вызов на данный endpoint.
     Создается запись о результате платежа и закреплятся за ордером,
     переводя статус последнего в состояние - оплачен.
+    Повторный вызов с тем же `reference` ничего не меняет и тоже отвечает 204.
     """,
 )
 async def payment(
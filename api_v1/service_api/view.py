@@ -0,0 +1,81 @@
+from fastapi import APIRouter
+
+from basket_app.basket_gc import basket_gc
+from core.api_shop import product_loader
+from order_app.account_number_allocator import account_number_allocator
+from order_app.api_bank import ApiPayBank
+from order_app.order_counts import order_count_cache
+from order_app.payment_link_dispatcher import payment_link_dispatcher
+from core.jwt_verifier import jwt_verifier
+from core.key_set import key_set
+
+
+router = APIRouter(tags=["Service"])
+
+
+@router.get(
+    "/cache/products/",
+    summary="Статистика кэша продуктов.",
+    description="""
+    Размер кэша и счетчики попаданий/промахов.
+    Нужны для подбора размера и TTL кэша.
+    """,
+)
+async def product_cache_stats():
+    return product_loader.stats()
+
+
+@router.get(
+    "/cache/order_counts/",
+    summary="Статистика кэша числа ордеров.",
+    description="Кэш приблизительного total для страниц ордеров (count=APPROXIMATE).",
+)
+async def order_count_cache_stats():
+    return order_count_cache.stats()
+
+
+@router.get(
+    "/cache/jwt/",
+    summary="Статистика кэша проверенных JWT.",
+    description="Сколько токенов в кэше и как часто проверка подписи не нужна.",
+)
+async def jwt_cache_stats():
+    return jwt_verifier.stats()
+
+
+@router.get(
+    "/jwt_keys/",
+    summary="Загруженные ключи JWT.",
+    description="kid загруженных ключей, сколько раз набор перечитывался и последняя ошибка.",
+)
+async def jwt_keys_stats():
+    return key_set.stats()
+
+
+@router.get(
+    "/bank/",
+    summary="Состояние интеграции с банком.",
+    description="""
+    Токен (есть ли живой, сколько ему осталось), состояние предохранителя
+    (closed/open/half_open, ошибки, отклоненные запросы), число повторов,
+    счетчики диспетчера платежных ссылок и выдачи номеров счетов.
+    """,
+)
+async def bank_stats():
+    return {
+        **ApiPayBank.stats(),
+        "payment_links": payment_link_dispatcher.stats(),
+        "account_numbers": account_number_allocator.stats(),
+    }
+
+
+@router.get(
+    "/basket_gc/",
+    summary="Состояние сборщика брошенных корзин.",
+    description="""
+    Сколько запусков было, сколько корзин удалено всего и за последний
+    запуск, длительность и последняя ошибка.
+    """,
+)
+async def basket_gc_stats():
+    return basket_gc.stats()
@@ -1,10 +1,161 @@
-from sqlalchemy import select, update
+from datetime import datetime
+
+from sqlalchemy import String, any_, bindparam, delete, exists, func, insert
+from sqlalchemy import select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import load_only
 
-from basket_app.models import Basket
+from basket_app.models import Basket, BasketItem
+from basket_app.utils import normalize_basket_items
+from order_app.models import Order
+from core.base_model import get_current_time
 from core.base_repository import SQLAlchemyRepository
 
-from basket_app.schemas import CheckoutStageSchema
+from basket_app.schemas import BasketItemOperationType, CheckoutStageSchema
+
+
+# Postgres: изменение одной позиции корзины одним запросом через JSONB
+ITEM_OPERATION_PG_SQL = """
+WITH target AS (
+    SELECT id, basket_items, gift_items
+    FROM baskets
+    WHERE uuid_id = :uuid_id AND completed = false
+    FOR UPDATE
+),
+new_items AS (
+    SELECT
+        e.pos,
+        CASE
+            WHEN (e.elem ->> 'prod_id')::int = CAST(:prod_id AS integer)
+            THEN jsonb_set(
+                e.elem,
+                '{count}',
+                to_jsonb(
+                    CASE
+                        WHEN CAST(:operation AS text) = 'INCREMENT'
+                        THEN coalesce((e.elem ->> 'count')::int, 0)
+                            + CAST(:value AS integer)
+                        ELSE CAST(:value AS integer)
+                    END
+                )
+            )
+            ELSE e.elem
+        END AS elem
+    FROM target,
+        jsonb_array_elements(
+            CASE
+                WHEN jsonb_typeof(target.basket_items::jsonb) = 'array'
+                THEN target.basket_items::jsonb
+                ELSE '[]'::jsonb
+            END
+        ) WITH ORDINALITY AS e(elem, pos)
+    WHERE NOT (
+        CAST(:operation AS text) = 'REMOVE'
+        AND (e.elem ->> 'prod_id')::int = CAST(:prod_id AS integer)
+    )
+),
+kept_items AS (
+    SELECT pos, elem
+    FROM new_items
+    WHERE coalesce(
+        (elem ->> 'prod_id')::int <> CAST(:prod_id AS integer)
+        OR (elem ->> 'count')::int > 0,
+        true
+    )
+)
+UPDATE baskets SET
+    basket_items = CASE
+        -- компактный формат {"prod_id": count}
+        WHEN jsonb_typeof(target.basket_items::jsonb) = 'object' THEN (
+            SELECT CASE
+                WHEN CAST(:operation AS text) = 'REMOVE' OR new_count <= 0
+                THEN target.basket_items::jsonb - CAST(:prod_id AS text)
+                ELSE target.basket_items::jsonb
+                    || jsonb_build_object(CAST(:prod_id AS text), new_count)
+            END
+            FROM (
+                SELECT CASE
+                    WHEN CAST(:operation AS text) = 'INCREMENT'
+                    THEN coalesce(
+                        (target.basket_items::jsonb ->> CAST(:prod_id AS text))::int,
+                        0
+                    ) + CAST(:value AS integer)
+                    ELSE CAST(:value AS integer)
+                END AS new_count
+            ) AS c
+        )
+        ELSE coalesce(
+            (SELECT jsonb_agg(elem ORDER BY pos) FROM kept_items), '[]'::jsonb
+        )
+    END::json,
+    gift_items = CASE
+        WHEN jsonb_typeof(target.basket_items::jsonb) = 'object'
+        THEN target.gift_items
+        ELSE coalesce(
+            (
+                SELECT jsonb_agg(g.elem ORDER BY g.pos)
+                FROM jsonb_array_elements(
+                    coalesce(target.gift_items::jsonb, '[]'::jsonb)
+                ) WITH ORDINALITY AS g(elem, pos)
+                WHERE g.elem ->> 'id' IN (
+                    SELECT elem ->> 'gift_prod_id' FROM kept_items
+                )
+            ),
+            '[]'::jsonb
+        )::json
+    END,
+    updated_at = :updated_at,
+    version = baskets.version + 1
+FROM target
+WHERE baskets.id = target.id
+RETURNING baskets.*
+"""
+
+
+def apply_item_operation(
+    basket_items: list | dict | None,
+    gift_items: list | None,
+    prod_id: int,
+    operation: BasketItemOperationType,
+    value: int,
+) -> tuple[list | dict, list]:
+    # то же, что ITEM_OPERATION_PG_SQL, но на стороне Python
+    if isinstance(basket_items, dict):
+        # компактный формат {"prod_id": count}, ключи в JSON - строки
+        new_items = {**basket_items}
+        key = str(prod_id)
+        if operation == BasketItemOperationType.INCREMENT:
+            count = int(new_items.get(key, 0)) + value
+        else:
+            count = value
+        if operation == BasketItemOperationType.REMOVE or count <= 0:
+            new_items.pop(key, None)
+        else:
+            new_items[key] = count
+        return new_items, list(gift_items or [])
+    new_items = []
+    for item in basket_items or []:
+        if isinstance(item, dict) and item.get("prod_id") == prod_id:
+            if operation == BasketItemOperationType.REMOVE:
+                continue
+            if operation == BasketItemOperationType.INCREMENT:
+                count = item.get("count", 0) + value
+            else:
+                count = value
+            if count <= 0:
+                continue
+            item = {**item, "count": count}
+        new_items.append(item)
+    gift_ids = {
+        str(item["gift_prod_id"])
+        for item in new_items
+        if isinstance(item, dict) and "gift_prod_id" in item
+    }
+    new_gift_items = [
+        gift for gift in gift_items or [] if str(gift.get("id")) in gift_ids
+    ]
+    return new_items, new_gift_items
 
 
 class BascketRepository(SQLAlchemyRepository):
@@ -21,7 +172,77 @@ class BascketRepository(SQLAlchemyRepository):
         except NoResultFound as e:
             raise NoResultFound(e)
 
+    async def get_objs_by_uuids(
+        self, uuid_ids: list[str], fields: list[str] | None = None, **filter_by
+    ) -> list[Basket]:
+        # один запрос на весь список; fields - грузим только эти колонки
+        if self.session.get_bind().dialect.name == "postgresql":
+            # uuid_id = ANY(:массив): один параметр, план не зависит от длины списка
+            uuid_ids = bindparam("uuid_ids", uuid_ids, type_=postgresql.ARRAY(String))
+            condition = self.model.uuid_id == any_(uuid_ids)
+        else:
+            condition = self.model.uuid_id.in_(uuid_ids)
+        stmt = select(self.model).where(condition).filter_by(**filter_by)
+        if fields is not None:
+            stmt = stmt.options(
+                load_only(*(getattr(self.model, field) for field in fields))
+            )
+        res = await self.session.execute(stmt)
+        return res.scalars().all()
+
+    async def get_obj_for_update(self, **filter_by) -> Basket | None:
+        stmt = select(self.model).filter_by(**filter_by).with_for_update()
+        res = await self.session.execute(stmt)
+        return res.scalars().first()
+
+    async def update_obj(self, uuid_id: str, data: dict):
+        # версию поднимаем явно: выражение version + 1 ORM применит и к
+        # объекту, уже загруженному в сессию (onupdate этого не делает)
+        data = {**data, "version": self.model.version + 1}
+        return await super().update_obj(uuid_id, data)
+
+    async def touch(self, uuid_id: str) -> Basket | None:
+        # новая версия корзины, когда меняется только basketitems;
+        # UPDATE заодно блокирует строку до конца транзакции
+        stmt = (
+            update(self.model)
+            .values(version=self.model.version + 1, updated_at=get_current_time())
+            .filter_by(uuid_id=uuid_id, completed=False)
+            .returning(self.model)
+        )
+        res = await self.session.execute(stmt)
+        return res.scalars().first()
+
+    async def set_items_json(self, uuid_id: str, basket_items: list) -> Basket:
+        # дописываем состав в JSON в той же операции, что уже подняла версию:
+        # version = version, иначе onupdate поднимет ее второй раз
+        stmt = (
+            update(self.model)
+            .values(basket_items=basket_items, version=self.model.version)
+            .filter_by(uuid_id=uuid_id)
+            .returning(self.model)
+            .execution_options(populate_existing=True)
+        )
+        res = await self.session.execute(stmt)
+        return res.scalar_one()
+
+    async def get_version(self, **filter_by) -> tuple[int, int] | None:
+        # только (id, version) - для ETag без чтения состава корзины
+        stmt = select(self.model.id, self.model.version).filter_by(**filter_by)
+        res = await self.session.execute(stmt)
+        row = res.first()
+        return None if row is None else tuple(row)
+
+    # диалекты, которые умеют INSERT ... ON CONFLICT ... RETURNING
+    upsert_dialects = {
+        "postgresql": postgresql.insert,
+        "sqlite": sqlite.insert,
+    }
+
     async def create_or_update(self, uuid_id: str, data: dict):
+        dialect_insert = self.upsert_dialects.get(self.session.get_bind().dialect.name)
+        if dialect_insert is not None:
+            return await self.upsert(dialect_insert, uuid_id, data)
         try:
             # Пытаемся найти объект по UUID
             existing_obj = await self.get_obj(uuid_id=uuid_id)
@@ -30,10 +251,89 @@ class BascketRepository(SQLAlchemyRepository):
         except NoResultFound as error:
             return await self.create_obj(data)
 
+    async def upsert(self, dialect_insert, uuid_id: str, data: dict):
+        # один запрос вместо SELECT + UPDATE/INSERT, без гонки по uuid_id
+        data = {**data, "uuid_id": uuid_id}
+        stmt = dialect_insert(self.model).values(**data)
+        values_to_update = {key: stmt.excluded[key] for key in data if key != "uuid_id"}
+        values_to_update["updated_at"] = get_current_time()
+        values_to_update["version"] = self.model.version + 1
+        stmt = (
+            stmt.on_conflict_do_update(
+                index_elements=[self.model.uuid_id],
+                set_=values_to_update,
+            )
+            .returning(self.model)
+            .execution_options(populate_existing=True)
+        )
+        res = await self.session.execute(stmt)
+        return res.scalar_one()
+
+    async def apply_item_operation(
+        self,
+        uuid_id: str,
+        prod_id: int,
+        operation: BasketItemOperationType,
+        value: int,
+    ) -> Basket | None:
+        if self.session.get_bind().dialect.name == "postgresql":
+            stmt = (
+                select(self.model)
+                .from_statement(text(ITEM_OPERATION_PG_SQL))
+                .params(
+                    uuid_id=uuid_id,
+                    prod_id=prod_id,
+                    operation=operation.value,
+                    value=value,
+                    updated_at=get_current_time(),
+                )
+                .execution_options(populate_existing=True)
+            )
+            res = await self.session.execute(stmt)
+            return res.scalars().first()
+
+        # остальные диалекты: блокируем строку и меняем позицию в Python
+        basket = await self.get_obj_for_update(uuid_id=uuid_id, completed=False)
+        if basket is None:
+            return None
+        basket_items, gift_items = apply_item_operation(
+            basket.basket_items, basket.gift_items, prod_id, operation, value
+        )
+        return await self.update_obj(
+            uuid_id, {"basket_items": basket_items, "gift_items": gift_items}
+        )
+
+    async def delete_abandoned(self, idle_before: datetime, limit: int) -> int:
+        # одна пачка брошенных корзин: не оформлены, без заказов,
+        # не менялись с idle_before; занятые строки пропускаем
+        last_change = func.coalesce(self.model.updated_at, self.model.created_at)
+        stmt = (
+            select(self.model.id)
+            .where(
+                self.model.completed == False,  # noqa: E712
+                last_change < idle_before,
+                ~exists().where(Order.uuid_id == self.model.uuid_id),
+            )
+            .order_by(self.model.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        res = await self.session.execute(stmt)
+        basket_ids = res.scalars().all()
+        if not basket_ids:
+            return 0
+        await self.session.execute(
+            delete(BasketItem).where(BasketItem.basket_id.in_(basket_ids))
+        )
+        await self.session.execute(
+            delete(self.model).where(self.model.id.in_(basket_ids))
+        )
+        return len(basket_ids)
+
     async def update_ob_pay(self, uuid_id: str, data: dict):
         stmt = (
             update(self.model)
-            .values(**data)
+            .values(**data, version=self.model.version + 1)
             .filter_by(
                 uuid_id=uuid_id,
                 completed=False,
@@ -46,3 +346,90 @@ class BascketRepository(SQLAlchemyRepository):
             return res.scalar_one()
         except Exception:
             pass
+
+
+class BasketItemRepository(SQLAlchemyRepository):
+    model = BasketItem
+
+    async def replace_items(self, basket_id: int, basket_items: list | None) -> None:
+        # весь состав корзины двумя запросами: DELETE + один bulk INSERT
+        await self.session.execute(delete(self.model).filter_by(basket_id=basket_id))
+        rows = [
+            {**row, "basket_id": basket_id}
+            for row in normalize_basket_items(basket_items)
+        ]
+        if rows:
+            await self.session.execute(insert(self.model), rows)
+
+    async def add_items(self, basket_id: int, basket_items: list) -> None:
+        rows = [
+            {**row, "basket_id": basket_id}
+            for row in normalize_basket_items(basket_items)
+        ]
+        if rows:
+            await self.session.execute(insert(self.model), rows)
+
+    async def get_items(self, basket_ids: list[int]) -> list[BasketItem]:
+        stmt = (
+            select(self.model)
+            .where(self.model.basket_id.in_(basket_ids))
+            .order_by(self.model.basket_id, self.model.id)
+        )
+        res = await self.session.execute(stmt)
+        return res.scalars().all()
+
+    async def get_basket_uuids_with_product(
+        self, prod_id: int, completed: bool = False
+    ) -> list[str]:
+        stmt = (
+            select(Basket.uuid_id)
+            .join(self.model, self.model.basket_id == Basket.id)
+            .where(self.model.prod_id == prod_id, Basket.completed == completed)
+            .order_by(Basket.id)
+        )
+        res = await self.session.execute(stmt)
+        return res.scalars().all()
+
+    async def get_reserved_quantity(
+        self, prod_ids: list[int] | None = None
+    ) -> dict[int, int]:
+        # сколько единиц продукта лежит в незавершенных корзинах
+        stmt = (
+            select(self.model.prod_id, func.sum(self.model.count))
+            .join(Basket, self.model.basket_id == Basket.id)
+            .where(Basket.completed == False)  # noqa: E712
+            .group_by(self.model.prod_id)
+        )
+        if prod_ids is not None:
+            stmt = stmt.where(self.model.prod_id.in_(prod_ids))
+        res = await self.session.execute(stmt)
+        return {prod_id: int(count) for prod_id, count in res.all()}
+
+    async def apply_item_operation(
+        self,
+        basket_id: int,
+        prod_id: int,
+        operation: BasketItemOperationType,
+        value: int,
+    ) -> bool:
+        # возвращает True, если продукт уже был в корзине
+        where = (self.model.basket_id == basket_id, self.model.prod_id == prod_id)
+        if operation == BasketItemOperationType.REMOVE:
+            res = await self.session.execute(delete(self.model).where(*where))
+            return res.rowcount > 0
+        if operation == BasketItemOperationType.INCREMENT:
+            new_count = self.model.count + value
+        else:
+            new_count = value
+        res = await self.session.execute(
+            update(self.model)
+            .where(*where)
+            .values(count=new_count)
+            .returning(self.model.count)
+        )
+        count = res.scalar_one_or_none()
+        if count is None:
+            return False
+        if count <= 0:
+            await self.session.execute(delete(self.model).where(*where))
+        return True
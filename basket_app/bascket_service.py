@@ -1,4 +1,5 @@
-from typing import List
+import asyncio
+from typing import AsyncIterator, List
 
 import httpx
 import jwt
@@ -6,27 +7,49 @@ import jwt
 # == Exceptions
 from fastapi import HTTPException, status
 from sqlalchemy.exc import IntegrityError, NoResultFound
+from sqlalchemy.orm.attributes import set_committed_value
 
 from basket_app.models import Basket
-from basket_app.schemas import BasketItemUpdate, BasketPydantic, BasketPydantic2
+from basket_app.schemas import (
+    BasketBatchResponse,
+    BasketItemOperation,
+    BasketItemOperationType,
+    BasketItemUpdate,
+    BasketPydantic,
+    BasketPydantic2,
+    BasketReadField,
+    BasketReadPydantic,
+)
 
 # == My
 from core import settings
+from core.auth import Principal
 from core.base_model import TokenSchema
 from core.base_UOW import IUnitOfWork
+from core.etag import check_if_match, make_etag
+from core.jwt_verifier import jwt_verifier
+from core.api_shop import product_loader
+from core.pagination import CursorPage, decode_id_cursor, encode_cursor
 
 
 class BascketService:
     async def sign_basket(
-        self, uow: IUnitOfWork, uuid_id: str, access_token: TokenSchema
+        self,
+        uow: IUnitOfWork,
+        uuid_id: str,
+        access_token: TokenSchema,
+        if_match: str | None = None,
     ):
         try:
             user_id = access_token.model_dump()["access_token"]["user_id"]
             data = {"user_id": user_id}
             async with uow:
+                await self.check_if_match(uow, uuid_id, if_match)
                 basket = await uow.bascket.update_obj(uuid_id=uuid_id, data=data)
+                await self.attach_items(uow, [basket])
                 await uow.commit()
-                return basket
+            await self.attach_item_details([basket])
+            return basket
         except KeyError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -47,9 +70,11 @@ class BascketService:
         new_bascket = product_details
 
         bascket_dict = new_bascket.model_dump()
+        basket_items = self.split_items_json(bascket_dict)
         async with uow:
             try:
                 bascket = await uow.bascket.create_obj(bascket_dict)
+                await self.save_items(uow, bascket, basket_items)
                 await uow.commit()
                 return bascket
             except IntegrityError as e:
@@ -60,16 +85,119 @@ class BascketService:
 
     async def get_baskets(self, uow: IUnitOfWork) -> list[Basket]:
         async with uow:
-            return await uow.bascket.get_all_objs()
+            baskets = await uow.bascket.get_all_objs()
+            await self.attach_items(uow, baskets)
+        return await self.attach_item_details(baskets)
+
+    async def get_baskets_page(
+        self, uow: IUnitOfWork, size: int, cursor: str | None = None
+    ) -> CursorPage[BasketReadPydantic]:
+        after_id = decode_id_cursor(cursor) if cursor else None
+        async with uow:
+            # +1 запись, чтобы понять, есть ли следующая страница
+            baskets = await uow.bascket.get_objs_after_id(after_id, size + 1)
+            has_next = len(baskets) > size
+            baskets = await self.attach_items(uow, baskets[:size])
+        await self.attach_item_details(baskets)
+        return CursorPage[BasketReadPydantic](
+            items=[BasketReadPydantic.model_validate(basket) for basket in baskets],
+            size=size,
+            next_cursor=encode_cursor(baskets[-1].id) if has_next else None,
+        )
+
+    async def export_baskets_ndjson(self, uow: IUnitOfWork) -> AsyncIterator[str]:
+        # по строке JSON на корзину, память не растет с размером таблицы
+        async with uow:
+            async for baskets in uow.bascket.stream_obj_partitions(
+                yield_per=settings.basket.export_yield_per
+            ):
+                # состав и детали - одним запросом на пачку, а не на корзину
+                await self.attach_items(uow, baskets)
+                await self.attach_item_details(baskets)
+                for basket in baskets:
+                    yield (
+                        BasketReadPydantic.model_validate(basket).model_dump_json()
+                        + "\n"
+                    )
 
     async def get_bascket_by_uuid(self, uow: IUnitOfWork, uuid_id: str) -> Basket:
         async with uow:
-            return await uow.bascket.get_obj(uuid_id=uuid_id, completed=False)
+            basket = await uow.bascket.get_obj(uuid_id=uuid_id, completed=False)
+            if basket is not None:
+                await self.attach_items(uow, [basket])
+        if basket is not None:
+            await self.attach_item_details([basket])
+        return basket
+
+    async def get_basckets_by_uuids(
+        self,
+        uow: IUnitOfWork,
+        uuid_ids: list[str],
+        fields: list[BasketReadField] | None = None,
+    ) -> BasketBatchResponse:
+        # то же, что get_bascket_by_uuid, но для списка и одним запросом
+        uuid_ids = list(dict.fromkeys(uuid_ids))
+        if len(uuid_ids) > settings.basket.batch_max_size:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Не больше {settings.basket.batch_max_size} корзин за запрос.",
+            )
+        # uuid_id всегда в ответе - по нему клиент сопоставит корзины с запросом
+        load_fields = (
+            None if fields is None else list(dict.fromkeys(["uuid_id", *fields]))
+        )
+        async with uow:
+            baskets = await uow.bascket.get_objs_by_uuids(
+                uuid_ids, fields=load_fields, completed=False
+            )
+            if fields is None or "basket_items" in fields:
+                await self.attach_items(uow, baskets)
+        if fields is None or "basket_items" in fields:
+            await self.attach_item_details(baskets)
+        by_uuid = {basket.uuid_id: basket for basket in baskets}
+        items = []
+        for uuid_id in uuid_ids:
+            basket = by_uuid.get(uuid_id)
+            if basket is None:
+                continue
+            if fields is None:
+                items.append(BasketReadPydantic.model_validate(basket).model_dump())
+            else:
+                items.append({field: getattr(basket, field) for field in load_fields})
+        return BasketBatchResponse(
+            items=items,
+            not_found=[uuid_id for uuid_id in uuid_ids if uuid_id not in by_uuid],
+        )
+
+    async def get_bascket_etag(self, uow: IUnitOfWork, uuid_id: str) -> str | None:
+        # ETag без чтения самой корзины - для ответа 304
+        async with uow:
+            version = await uow.bascket.get_version(uuid_id=uuid_id, completed=False)
+            return None if version is None else make_etag(*version)
+
+    @staticmethod
+    def etag(basket: Basket) -> str:
+        return make_etag(basket.id, basket.version)
+
+    async def check_if_match(
+        self, uow: IUnitOfWork, uuid_id: str, if_match: str | None
+    ) -> None:
+        # If-Match: защита от потерянного обновления. Строку блокируем,
+        # чтобы версия не поменялась до конца транзакции
+        if if_match is None:
+            return
+        basket = await uow.bascket.get_obj_for_update(uuid_id=uuid_id)
+        check_if_match(if_match, None if basket is None else self.etag(basket))
 
     async def get_bascket_by_user_id(self, uow: IUnitOfWork, user_id: str) -> Basket:
         try:
             async with uow:
-                return await uow.bascket.get_obj(user_id=user_id, completed=False)
+                basket = await uow.bascket.get_obj(user_id=user_id, completed=False)
+                if basket is not None:
+                    await self.attach_items(uow, [basket])
+            if basket is not None:
+                await self.attach_item_details([basket])
+            return basket
         except NoResultFound:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -82,6 +210,7 @@ class BascketService:
         uuid_id: str,
         bascket_update: BasketPydantic,
         partial: bool = False,
+        if_match: str | None = None,
     ) -> Basket:
         # TODO повтор
         prod_ids = (
@@ -93,24 +222,39 @@ class BascketService:
         bascket_update = product_details
 
         data = bascket_update.model_dump(exclude_unset=partial)
+        basket_items = self.split_items_json(data)
         async with uow:
             try:
+                await self.check_if_match(uow, uuid_id, if_match)
                 bascket = await uow.bascket.update_obj(uuid_id=uuid_id, data=data)
+                if "basket_items" in data:
+                    await self.save_items(uow, bascket, basket_items)
+                else:
+                    await self.attach_items(uow, [bascket])
                 await uow.commit()
-                return bascket
             except NoResultFound as e:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Корзины {uuid_id!r} не существует.",
                 )
+        if "basket_items" not in data:
+            await self.attach_item_details([bascket])
+        return bascket
 
-    async def delete_bascket(self, uow: IUnitOfWork, uuid_id: str) -> None:
+    async def delete_bascket(
+        self, uow: IUnitOfWork, uuid_id: str, if_match: str | None = None
+    ) -> None:
         async with uow:
+            await self.check_if_match(uow, uuid_id, if_match)
             await uow.bascket.delete_obj(uuid_id=uuid_id)
             await uow.commit()
 
     async def create_or_update_bascket(
-        self, uow: IUnitOfWork, uuid_id: str, bascket_data: BasketPydantic
+        self,
+        uow: IUnitOfWork,
+        uuid_id: str,
+        bascket_data: BasketPydantic,
+        if_match: str | None = None,
     ) -> Basket:
         # достаем ИД пользователя из JWT
         user_id = self.extract_user_id_from_jwt(bascket_data.user_id)
@@ -125,11 +269,14 @@ class BascketService:
         bascket_data = product_details
 
         bascket_dict = bascket_data.model_dump()
+        basket_items = self.split_items_json(bascket_dict)
         async with uow:
             try:
+                await self.check_if_match(uow, uuid_id, if_match)
                 bascket = await uow.bascket.create_or_update(
                     uuid_id=uuid_id, data=bascket_dict
                 )
+                await self.save_items(uow, bascket, basket_items)
                 await uow.commit()
                 return bascket
             except IntegrityError as e:
@@ -139,17 +286,29 @@ class BascketService:
                 )
 
     async def create_or_update_bascket_2(
-        self, uow: IUnitOfWork, uuid_id: str, bascket_data: BasketPydantic2
+        self,
+        uow: IUnitOfWork,
+        uuid_id: str,
+        bascket_data: BasketPydantic2,
+        if_match: str | None = None,
+        principal: Principal | None = None,
     ) -> Basket:
-        # достаем ИД пользователя из JWT
-        user_id = self.extract_user_id_from_jwt(bascket_data.user_id)
+        # достаем ИД пользователя из JWT, а если его нет в теле - из заголовка,
+        # который уже разобран зависимостью get_principal
+        if bascket_data.user_id is None and principal is not None:
+            user_id = principal.user_id
+        else:
+            user_id = self.extract_user_id_from_jwt(bascket_data.user_id)
         bascket_data.user_id = user_id
         bascket_dict = bascket_data.model_dump()
+        basket_items = self.split_items_json(bascket_dict)
         async with uow:
             try:
+                await self.check_if_match(uow, uuid_id, if_match)
                 bascket = await uow.bascket.create_or_update(
                     uuid_id=uuid_id, data=bascket_dict
                 )
+                await self.save_items(uow, bascket, basket_items)
                 await uow.commit()
                 return bascket
             except IntegrityError as e:
@@ -163,9 +322,7 @@ class BascketService:
     def extract_user_id_from_jwt(self, jwt_token: str | None) -> int | None:
         if jwt_token is not None:
             try:
-                decoded = jwt.decode(
-                    jwt_token, settings.auth_jwt.public_key, settings.auth_jwt.algorithm
-                )
+                decoded = jwt_verifier.decode(jwt_token)
                 return decoded["user_id"]
             except jwt.PyJWTError as e:
                 raise HTTPException(status_code=400, detail=f"Недействительный JWT.")
@@ -174,38 +331,28 @@ class BascketService:
     async def fetch_product_details(
         self, prod_ids: List[int], new_bascket: BasketPydantic
     ) -> BasketPydantic:
-        prod_ids_str = ",".join(map(str, prod_ids))
-        url = settings.api_shop.get_prod_by_ids(prod_ids_str=prod_ids_str)
-        print(f"-----------URL--------->>>> {url}")
+        basket_items = new_bascket.basket_items or []
+        gift_ids = list(
+            dict.fromkeys(
+                item["gift_prod_id"] for item in basket_items if "gift_prod_id" in item
+            )
+        )
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url)
-                # response.raise_for_status()  # Проверка на HTTP ошибки
-                details_dict = {detail["id"]: detail for detail in response.json()}
-                list_prod_gifts_ids = []
-                for item in new_bascket.basket_items:
-                    prod_detail = details_dict.get(item["prod_id"])
-                    if prod_detail:
-                        item["prod"] = prod_detail
-                        item["name"] = prod_detail["name_product"]
-                        item["slug"] = prod_detail["slug"]
-                        item["url"] = settings.api_shop.get_url_admin_prod_detail(
-                            prod_id=prod_detail["id"]
-                        )
-                        item["urlapi"] = settings.api_shop.get_url_api_prod_detail(
-                            prod_slug=item["slug"]
-                        )
-                    if "gift_prod_id" in item:
-                        list_prod_gifts_ids.append(item["gift_prod_id"])
-                prod_gift_ids_str = ",".join(map(str, list_prod_gifts_ids))
-                url_gift_prod = settings.api_shop.get_prod_by_ids(
-                    prod_ids_str=prod_gift_ids_str
-                )
-                response_gift_prod = await client.get(url_gift_prod)
-                if response_gift_prod.status_code != 200:
-                    return new_bascket
-                new_bascket.gift_items = response_gift_prod.json()
+            # продукты и подарки запрашиваем параллельно
+            details_dict, gifts_dict = await asyncio.gather(
+                product_loader.load_many(prod_ids),
+                self.fetch_gift_details(gift_ids),
+            )
+            for item in basket_items:
+                prod_detail = details_dict.get(item["prod_id"])
+                if prod_detail:
+                    self.fill_item_details(item, prod_detail)
+            if gifts_dict is None:
                 return new_bascket
+            new_bascket.gift_items = [
+                gifts_dict[gift_id] for gift_id in gift_ids if gift_id in gifts_dict
+            ]
+            return new_bascket
         except httpx.HTTPStatusError as e:
             return []
             raise AttributeError("Корзине нужны продукты")
@@ -214,22 +361,242 @@ class BascketService:
             return []
             print(f"Request error occurred: {e}")
 
+    @staticmethod
+    def fill_item_details(item: dict, prod_detail: dict) -> None:
+        item["prod"] = prod_detail
+        item["name"] = prod_detail["name_product"]
+        item["slug"] = prod_detail["slug"]
+        item["url"] = settings.api_shop.get_url_admin_prod_detail(
+            prod_id=prod_detail["id"]
+        )
+        item["urlapi"] = settings.api_shop.get_url_api_prod_detail(
+            prod_slug=item["slug"]
+        )
+
+    async def fetch_gift_details(self, gift_ids: List[int]) -> dict[int, dict] | None:
+        # без подарков в магазин не ходим
+        if not gift_ids:
+            return {}
+        try:
+            return await product_loader.load_many(gift_ids)
+        except httpx.HTTPStatusError:
+            return None
+
     async def basket_item_update(
         self,
         uow: IUnitOfWork,
         uuid_id: str,
         product_id: str,
         data_item: BasketItemUpdate,
+        if_match: str | None = None,
     ) -> None:
-        basket = await self.get_bascket_by_uuid(uow=uow, uuid_id=uuid_id)
-        for item in basket.basket_items:
-            if item["prod_id"] == int(product_id):
-                if data_item.delete:
-                    basket.basket_items.remove(item)
-                item.update({"count": data_item.count})
-        bascket_update = BasketPydantic(
-            uuid_id=uuid_id, basket_items=basket.basket_items
+        operation = BasketItemOperation(
+            operation=(
+                BasketItemOperationType.REMOVE
+                if data_item.delete
+                else BasketItemOperationType.SET
+            ),
+            value=data_item.count,
+        )
+        async with uow:
+            await self.check_if_match(uow, uuid_id, if_match)
+            basket = await self.lock_and_apply_json_operation(
+                uow, uuid_id, int(product_id), operation
+            )
+            await uow.bascket_items.apply_item_operation(
+                basket_id=basket.id,
+                prod_id=int(product_id),
+                operation=operation.operation,
+                value=operation.value,
+            )
+            await uow.commit()
+
+    async def apply_item_operation(
+        self,
+        uow: IUnitOfWork,
+        uuid_id: str,
+        product_id: int,
+        item_operation: BasketItemOperation,
+        if_match: str | None = None,
+    ) -> Basket:
+        # детали нового продукта берем из магазина до блокировки корзины
+        new_items = await self.prefetch_new_item(
+            uow, uuid_id, product_id, item_operation
         )
-        await self.update_bascket(
-            uow=uow, uuid_id=uuid_id, bascket_update=bascket_update
+        async with uow:
+            await self.check_if_match(uow, uuid_id, if_match)
+            basket = await self.lock_and_apply_json_operation(
+                uow, uuid_id, product_id, item_operation
+            )
+            product_existed = await uow.bascket_items.apply_item_operation(
+                basket_id=basket.id,
+                prod_id=product_id,
+                operation=item_operation.operation,
+                value=item_operation.value,
+            )
+            is_new_product = (
+                item_operation.operation != BasketItemOperationType.REMOVE
+                and item_operation.value > 0
+                and not product_existed
+            )
+            if is_new_product and isinstance(basket.basket_items, dict):
+                # компактный формат: деталей продукта не храним, в магазин не идем
+                await uow.bascket_items.add_items(
+                    basket.id, {product_id: item_operation.value}
+                )
+            elif is_new_product:
+                if new_items is None:
+                    # продукт убрали между чтением и блокировкой - редкий случай
+                    new_items = await self.fetch_new_item(product_id, item_operation)
+                await uow.bascket_items.add_items(basket.id, new_items)
+                if settings.basket.items_json_cache:
+                    basket = await uow.bascket.set_items_json(
+                        uuid_id=uuid_id, basket_items=basket.basket_items + new_items
+                    )
+            await self.attach_items(uow, [basket])
+            await uow.commit()
+        # детали - уже после снятия блокировки
+        await self.attach_item_details([basket])
+        return basket
+
+    async def prefetch_new_item(
+        self,
+        uow: IUnitOfWork,
+        uuid_id: str,
+        product_id: int,
+        item_operation: BasketItemOperation,
+    ) -> list | None:
+        # None - продукт не добавляется (уже есть, удаление, компактный формат)
+        if (
+            item_operation.operation == BasketItemOperationType.REMOVE
+            or item_operation.value <= 0
+        ):
+            return None
+        async with uow:
+            basket = await uow.bascket.get_obj(uuid_id=uuid_id, completed=False)
+            if basket is None:
+                return None
+            await self.attach_items(uow, [basket])
+        if isinstance(basket.basket_items, dict) or any(
+            item.get("prod_id") == product_id for item in basket.basket_items or []
+        ):
+            return None
+        return await self.fetch_new_item(product_id, item_operation)
+
+    async def fetch_new_item(
+        self, product_id: int, item_operation: BasketItemOperation
+    ) -> list:
+        new_items = BasketPydantic(
+            basket_items=[{"prod_id": product_id, "count": item_operation.value}]
         )
+        new_items = await self.fetch_product_details([product_id], new_items)
+        if not isinstance(new_items, BasketPydantic):
+            # fetch_product_details вернул [] - магазин не ответил
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервис магазина недоступен, повторите позже.",
+            )
+        return new_items.basket_items
+
+    async def lock_and_apply_json_operation(
+        self,
+        uow: IUnitOfWork,
+        uuid_id: str,
+        product_id: int,
+        item_operation: BasketItemOperation,
+    ) -> Basket:
+        # с JSON кэшем меняем позицию в baskets.basket_items одним запросом,
+        # без него - только поднимаем версию (и блокируем строку) корзины
+        if settings.basket.items_json_cache:
+            basket = await uow.bascket.apply_item_operation(
+                uuid_id=uuid_id,
+                prod_id=product_id,
+                operation=item_operation.operation,
+                value=item_operation.value,
+            )
+        else:
+            basket = await uow.bascket.touch(uuid_id=uuid_id)
+        if basket is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Корзины {uuid_id!r} не существует.",
+            )
+        return basket
+
+    # == нормализованный состав корзины ====================================
+    def split_items_json(self, data: dict) -> list | dict | None:
+        # состав корзины пишется в basketitems, а в JSON колонку - только
+        # если включен items_json_cache
+        basket_items = data.get("basket_items")
+        if "basket_items" in data and not settings.basket.items_json_cache:
+            # пустое значение того же формата: список или {prod_id: count}
+            data["basket_items"] = {} if isinstance(basket_items, dict) else []
+        return basket_items
+
+    async def save_items(
+        self, uow: IUnitOfWork, basket: Basket, basket_items: list | dict | None
+    ) -> None:
+        await uow.bascket_items.replace_items(basket.id, basket_items)
+        if not settings.basket.items_json_cache:
+            set_committed_value(basket, "basket_items", basket_items)
+
+    async def attach_items(
+        self, uow: IUnitOfWork, baskets: list[Basket]
+    ) -> list[Basket]:
+        # без JSON кэша собираем basket_items из таблицы basketitems
+        if settings.basket.items_json_cache or not baskets:
+            return baskets
+        items_by_basket = {basket.id: [] for basket in baskets}
+        for item in await uow.bascket_items.get_items(list(items_by_basket)):
+            items_by_basket[item.basket_id].append(item)
+        for basket in baskets:
+            items = items_by_basket[basket.id]
+            if isinstance(basket.basket_items, dict):
+                basket_items = {item.prod_id: item.count for item in items}
+            else:
+                basket_items = []
+                for item in items:
+                    row = {"prod_id": item.prod_id, "count": item.count}
+                    if item.gift_prod_id is not None:
+                        row["gift_prod_id"] = item.gift_prod_id
+                    basket_items.append(row)
+            set_committed_value(basket, "basket_items", basket_items)
+        return baskets
+
+    async def attach_item_details(self, baskets: list[Basket]) -> list[Basket]:
+        # без JSON кэша детали продуктов не хранятся - дописываем их из кэша
+        # продуктов, как при записи. Вызывать вне транзакции: может пойти в магазин
+        if settings.basket.items_json_cache:
+            return baskets
+        items = [
+            item
+            for basket in baskets
+            if isinstance(basket.basket_items, list)
+            for item in basket.basket_items
+        ]
+        if not items:
+            return baskets
+        try:
+            details_dict = await product_loader.load_many(
+                item["prod_id"] for item in items
+            )
+        except httpx.HTTPError:
+            # магазин недоступен - отдаем состав без деталей
+            return baskets
+        for item in items:
+            prod_detail = details_dict.get(item["prod_id"])
+            if prod_detail:
+                self.fill_item_details(item, prod_detail)
+        return baskets
+
+    async def get_basket_uuids_with_product(
+        self, uow: IUnitOfWork, prod_id: int
+    ) -> list[str]:
+        async with uow:
+            return await uow.bascket_items.get_basket_uuids_with_product(prod_id)
+
+    async def get_reserved_quantity(
+        self, uow: IUnitOfWork, prod_ids: list[int] | None = None
+    ) -> dict[int, int]:
+        async with uow:
+            return await uow.bascket_items.get_reserved_quantity(prod_ids)
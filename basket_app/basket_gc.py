@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from core.base_model import get_current_time
+from core.base_UOW import UnitOfWork
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AbandonedBasketCollector:
+    """Удаление брошенных корзин: не оформлены, без заказов и не менялись
+    дольше idle_days.
+
+    Удаляем пачками по batch_size, каждая пачка - своя короткая транзакция,
+    между пачками пауза batch_pause, чтобы не держать блокировки и не
+    мешать рабочей нагрузке.
+    """
+
+    def __init__(
+        self,
+        idle_days: int,
+        batch_size: int,
+        batch_pause: float,
+        interval: float,
+    ) -> None:
+        self.idle_days = idle_days
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        # метрики
+        self.runs = 0
+        self.deleted_total = 0
+        self.last_run_started = None
+        self.last_run_deleted = 0
+        self.last_run_batches = 0
+        self.last_run_duration = None
+        self.last_error = None
+        self.running = False
+
+    async def collect_once(self) -> int:
+        # параллельные запуски (фон + ручной) не нужны
+        async with self._lock:
+            return await self._collect()
+
+    async def _collect(self) -> int:
+        idle_before = get_current_time() - timedelta(days=self.idle_days)
+        started = time.monotonic()
+        self.running = True
+        self.runs += 1
+        self.last_run_started = get_current_time()
+        self.last_run_deleted = 0
+        self.last_run_batches = 0
+        self.last_error = None
+        try:
+            while True:
+                uow = UnitOfWork()
+                async with uow:
+                    deleted = await uow.bascket.delete_abandoned(
+                        idle_before=idle_before, limit=self.batch_size
+                    )
+                    await uow.commit()
+                if deleted:
+                    self.last_run_batches += 1
+                    self.last_run_deleted += deleted
+                    self.deleted_total += deleted
+                    logger.info(
+                        "Сборка корзин: пачка %s, удалено %s (всего за запуск %s)",
+                        self.last_run_batches,
+                        deleted,
+                        self.last_run_deleted,
+                    )
+                if deleted < self.batch_size:
+                    break
+                await asyncio.sleep(self.batch_pause)
+        except Exception as e:
+            self.last_error = repr(e)
+            raise
+        finally:
+            self.running = False
+            self.last_run_duration = time.monotonic() - started
+        return self.last_run_deleted
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.collect_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Сборка брошенных корзин завершилась с ошибкой")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None and not self._task.done(),
+            "running": self.running,
+            "idle_days": self.idle_days,
+            "batch_size": self.batch_size,
+            "runs": self.runs,
+            "deleted_total": self.deleted_total,
+            "last_run_started": self.last_run_started,
+            "last_run_deleted": self.last_run_deleted,
+            "last_run_batches": self.last_run_batches,
+            "last_run_duration": self.last_run_duration,
+            "last_error": self.last_error,
+        }
+
+
+basket_gc = AbandonedBasketCollector(
+    idle_days=settings.basket.gc_idle_days,
+    batch_size=settings.basket.gc_batch_size,
+    batch_pause=settings.basket.gc_batch_pause,
+    interval=settings.basket.gc_interval,
+)
+
+
+if __name__ == "__main__":
+    # разовый запуск из cron/k8s job: python -m basket_app.basket_gc
+    parser = argparse.ArgumentParser(description="Удаление брошенных корзин.")
+    parser.add_argument("--idle-days", type=int, default=basket_gc.idle_days)
+    parser.add_argument("--batch-size", type=int, default=basket_gc.batch_size)
+    parser.add_argument("--batch-pause", type=float, default=basket_gc.batch_pause)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    basket_gc.idle_days = args.idle_days
+    basket_gc.batch_size = args.batch_size
+    basket_gc.batch_pause = args.batch_pause
+    deleted = asyncio.run(basket_gc.collect_once())
+    print(f"Удалено корзин: {deleted}")
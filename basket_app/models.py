@@ -1,6 +1,7 @@
 from sqlalchemy import Enum as SQLEnum
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint
 from sqlalchemy import ForeignKey, Text, DECIMAL, Integer, TIMESTAMP, UUID
+from sqlalchemy import literal_column
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import JSON
 
@@ -15,6 +16,8 @@ class Basket(Base):
         UniqueConstraint("uuid_id"),
         UniqueConstraint("created_at"),
     )
+    # version после UPDATE забираем через RETURNING, без ленивой догрузки
+    __mapper_args__ = {"eager_defaults": True}
     # уникальный код от клиентской стороны
     uuid_id: Mapped[str] = mapped_column()
     # id пользователя, если набирал корзину аутентифицированным (достать с JWT)
@@ -44,13 +47,55 @@ class Basket(Base):
         default=list,
         nullable=True,
     )
+    # растет на каждое изменение корзины, из него собирается ETag.
+    # ON CONFLICT и сырой SQL onupdate не применяют - там +1 явно
+    version: Mapped[int] = mapped_column(
+        nullable=False,
+        default=1,
+        server_default="1",
+        onupdate=literal_column("version") + 1,
+    )
     orders: Mapped["Order"] = relationship(  # type: ignore
         "Order",
         back_populates="basket",
     )
+    # нормализованный состав корзины
+    items: Mapped[list["BasketItem"]] = relationship(
+        "BasketItem",
+        back_populates="basket",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
     def __str__(self):
         return f"Basket id={self.id}, uuid_id={self.uuid_id!r})"
 
     def __repr__(self):
         return str(self)
+
+
+class BasketItem(Base):
+    __table_args__ = (
+        # одна строка на продукт в корзине, заодно индекс по basket_id
+        Index("ix_basketitems_basket_id_prod_id", "basket_id", "prod_id", unique=True),
+        # "в каких корзинах лежит продукт" и "сколько продукта зарезервировано"
+        Index("ix_basketitems_prod_id", "prod_id"),
+    )
+    basket_id: Mapped[int] = mapped_column(
+        ForeignKey("baskets.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    prod_id: Mapped[int] = mapped_column(nullable=False)
+    count: Mapped[int] = mapped_column(nullable=False, default=1)
+    # ID подарка, который идет вместе с продуктом
+    gift_prod_id: Mapped[int | None] = mapped_column(nullable=True)
+    basket: Mapped["Basket"] = relationship(
+        "Basket",
+        back_populates="items",
+    )
+
+    def __str__(self):
+        return f"BasketItem basket_id={self.basket_id}, prod_id={self.prod_id})"
+
+    def __repr__(self):
+        return str(self)
@@ -1,7 +1,11 @@
+from datetime import datetime
 from enum import Enum
-from typing import Annotated, Dict, List, Optional
+from typing import Annotated, Any, Dict, List, Literal, Optional
+from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from basket_app.utils import to_count_map
 
 
 # Определение этапов оформления
@@ -10,6 +14,28 @@ class CheckoutStageSchema(str, Enum):
     IN_PROGRESS = "IN_PROGRESS"
 
 
+# Операции над одной позицией корзины
+class BasketItemOperationType(str, Enum):
+    INCREMENT = "INCREMENT"
+    SET = "SET"
+    REMOVE = "REMOVE"
+
+
+# Поля корзины, которые можно запросить в пакетном чтении
+BasketReadField = Literal[
+    "id",
+    "uuid_id",
+    "user_id",
+    "completed",
+    "checkout_stage",
+    "basket_items",
+    "gift_items",
+    "version",
+    "created_at",
+    "updated_at",
+]
+
+
 class SimpleMSGErrorPydantic(BaseModel):
     status_code: int
     message: str
@@ -42,21 +68,33 @@ class BasketPydantic2(BaseModel):
         ),
     ] = None
     basket_items: Annotated[
-        # TODO улучшить аннотацию
-        List[int] | None,
+        Dict[int, int] | None,
         Field(
             ...,
-            description="Состав корзины",
+            description="Состав корзины {ID товара: кол-во}. "
+            "Старый формат - список ID с повторами - тоже принимается.",
             examples=[
-                [
-                    1,
-                    2,
-                    3,
-                ]
+                {
+                    76: 4,
+                    34: 2,
+                    55: 1,
+                }
             ],
         ),
     ] = None
 
+    @field_validator("basket_items", mode="before")
+    def validate_basket_items(cls, basket_items: list | dict | None):
+        try:
+            basket_items = to_count_map(basket_items)
+        except (TypeError, ValueError):
+            raise ValueError("Ожидается {ID товара: кол-во} или список ID.")
+        if basket_items is not None and any(
+            count <= 0 for count in basket_items.values()
+        ):
+            raise ValueError("Кол-во товара должно быть больше нуля.")
+        return basket_items
+
 
 class BasketPydantic(BaseModel):
     model_config = ConfigDict(
@@ -141,3 +179,78 @@ class BasketItemUpdate(BaseModel):
             # description=
         ),
     ] = False
+
+
+class BasketItemOperation(BaseModel):
+    model_config = ConfigDict(
+        strict=True,
+        json_schema_extra={
+            "example": {
+                "operation": BasketItemOperationType.INCREMENT,
+                "value": 1,
+            }
+        },
+    )
+
+    operation: Annotated[
+        BasketItemOperationType,
+        Field(
+            ...,
+            strict=False,  # иначе из JSON строку в Enum не превратить
+            description="INCREMENT - изменить кол-во на value (можно отрицательное), "
+            "SET - установить кол-во value, REMOVE - удалить позицию.",
+        ),
+    ]
+    value: Annotated[
+        int,
+        Field(
+            ...,
+            description="Изменение или новое кол-во. Если кол-во стало <= 0 - "
+            "позиция удаляется.",
+        ),
+    ] = 1
+
+
+class BasketReadPydantic(BaseModel):
+    model_config = ConfigDict(
+        from_attributes=True,
+    )
+
+    id: int
+    uuid_id: str
+    user_id: UUID | None = None
+    completed: bool | None = None
+    checkout_stage: CheckoutStageSchema
+    # список позиций или компактный формат {prod_id: count}
+    basket_items: List[Any] | Dict[Any, Any] | None = None
+    gift_items: List[Any] | None = None
+    version: int | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+
+
+class BasketBatchRequest(BaseModel):
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "uuid_ids": ["6a1b...", "a7c2..."],
+                "fields": ["uuid_id", "basket_items", "version"],
+            }
+        },
+    )
+
+    uuid_ids: Annotated[
+        List[str],
+        Field(..., min_length=1, description="uuid_id корзин."),
+    ]
+    fields: Annotated[
+        List[BasketReadField] | None,
+        Field(description="Какие поля вернуть. Без fields - корзина целиком."),
+    ] = None
+
+
+class BasketBatchResponse(BaseModel):
+    # найденные корзины в порядке запроса
+    items: List[Dict[str, Any]]
+    # uuid_id, по которым незавершенной корзины нет
+    not_found: List[str]
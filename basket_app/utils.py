@@ -0,0 +1,43 @@
+from collections import Counter
+
+
+def to_count_map(basket_items: list | dict | None) -> dict[int, int] | None:
+    # компактный формат состава корзины {prod_id: count}
+    # старый формат [76, 76, 34] -> {76: 2, 34: 1}
+    if basket_items is None:
+        return None
+    if isinstance(basket_items, dict):
+        return {int(prod_id): int(count) for prod_id, count in basket_items.items()}
+    return dict(Counter(int(prod_id) for prod_id in basket_items))
+
+
+def normalize_basket_items(basket_items: list | dict | None) -> list[dict]:
+    # приводит состав корзины к строкам таблицы basketitems:
+    # [{"prod_id": 1, "count": 2}], [1, 1, 5] и {"1": 2} -> по строке на продукт
+    if isinstance(basket_items, dict):
+        basket_items = [
+            {"prod_id": prod_id, "count": count}
+            for prod_id, count in basket_items.items()
+        ]
+    rows: dict[int, dict] = {}
+    for item in basket_items or []:
+        if isinstance(item, dict):
+            prod_id = int(item["prod_id"])
+            count = int(item.get("count", 1))
+            gift_prod_id = item.get("gift_prod_id")
+        else:
+            prod_id, count, gift_prod_id = int(item), 1, None
+        row = rows.setdefault(
+            prod_id, {"prod_id": prod_id, "count": 0, "gift_prod_id": None}
+        )
+        row["count"] += count
+        if gift_prod_id is not None:
+            row["gift_prod_id"] = int(gift_prod_id)
+    return [row for row in rows.values() if row["count"] > 0]
+
+
+def basket_item_counts(basket_items: list | dict | None) -> dict[int, int]:
+    # {prod_id: count} для любого формата состава корзины
+    return {
+        row["prod_id"]: row["count"] for row in normalize_basket_items(basket_items)
+    }
@@ -7,5 +7,5 @@ from core.base_model import Base
 from core.settings import settings
 
 # for migrations
-from basket_app.models import Basket
-from order_app.models import Order
+from basket_app.models import Basket, BasketItem
+from order_app.models import Order, PaymentLinkOutbox
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from typing import Iterable
+
+from core.cache import TTLCache
+from core.http_client import HttpClientManager, shop_http_manager
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProductLoader:
+    """Получение деталей продуктов из API магазина через кэш.
+
+    В магазин уходят только те ID, которых нет в кэше. Несвежие записи
+    отдаются сразу, а обновляются фоновым запросом.
+
+    Промахи от параллельных вызовов копятся batch_window секунд и уходят
+    одним запросом на город; ID, которые уже запрошены, повторно не
+    запрашиваются - вызывающие ждут тот же результат (single-flight).
+    """
+
+    def __init__(
+        self,
+        http_manager: HttpClientManager,
+        cache: TTLCache,
+        batch_window: float = 0.005,
+        max_batch_size: int = 200,
+    ) -> None:
+        self.http_manager = http_manager
+        self.cache = cache
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        # ключ (prod_id, city) -> результат запроса, который уже в пути
+        self._inflight: dict[tuple[int, str | None], asyncio.Future] = {}
+        # город -> ID, ожидающие отправки в текущем окне
+        self._pending: dict[str | None, list[int]] = {}
+        self._scheduled: set[str | None] = set()
+        self._background_tasks: set[asyncio.Task] = set()
+        self.batches_sent = 0
+        self.ids_requested = 0
+        self.coalesced = 0
+
+    async def load_many(
+        self,
+        prod_ids: Iterable[int],
+        city: str | None = None,
+        allow_stale: bool = True,
+    ) -> dict[int, dict]:
+        # allow_stale=False - несвежие записи ждем из магазина (цены для заказа)
+        products = {}
+        missing, stale = [], []
+        for prod_id in dict.fromkeys(prod_ids):
+            entry = self.cache.get_entry((prod_id, city))
+            if entry is None or not (allow_stale or entry.is_fresh()):
+                missing.append(prod_id)
+                continue
+            products[prod_id] = entry.value
+            if not entry.is_fresh():
+                stale.append(prod_id)
+
+        if stale:
+            self._run_in_background(self._load_batched(stale, city))
+        if missing:
+            products.update(await self._load_batched(missing, city))
+        return products
+
+    async def fetch(self, prod_ids: list[int], city: str | None = None) -> list:
+        params = {"ids": ",".join(map(str, prod_ids))}
+        if city is not None:
+            params["city"] = city
+        response = await self.http_manager.client.get(
+            settings.api_shop.get_prod_by_ids(), params=params
+        )
+        response.raise_for_status()
+        data = response.json()
+        # с городом API отдает {"results": [...]}, без него - список
+        if isinstance(data, dict):
+            return data.get("results") or []
+        return data
+
+    async def _load_batched(
+        self, prod_ids: list[int], city: str | None
+    ) -> dict[int, dict]:
+        loop = asyncio.get_running_loop()
+        futures = {}
+        for prod_id in prod_ids:
+            key = (prod_id, city)
+            future = self._inflight.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._inflight[key] = future
+                self._pending.setdefault(city, []).append(prod_id)
+            else:
+                self.coalesced += 1
+            futures[prod_id] = future
+
+        self._schedule_flush(city)
+
+        # shield: отмена одного вызывающего не должна отменять общий запрос
+        results = await asyncio.gather(
+            *(asyncio.shield(future) for future in futures.values())
+        )
+        return {
+            prod_id: detail
+            for prod_id, detail in zip(futures, results)
+            if detail is not None
+        }
+
+    def _schedule_flush(self, city: str | None) -> None:
+        if city not in self._pending or city in self._scheduled:
+            return
+        self._scheduled.add(city)
+        asyncio.get_running_loop().call_later(
+            self.batch_window,
+            lambda: self._run_in_background(self._flush(city)),
+        )
+
+    async def _flush(self, city: str | None) -> None:
+        self._scheduled.discard(city)
+        prod_ids = self._pending.pop(city, [])
+        chunks = [
+            prod_ids[i : i + self.max_batch_size]
+            for i in range(0, len(prod_ids), self.max_batch_size)
+        ]
+        await asyncio.gather(*(self._fetch_chunk(chunk, city) for chunk in chunks))
+
+    async def _fetch_chunk(self, prod_ids: list[int], city: str | None) -> None:
+        self.batches_sent += 1
+        self.ids_requested += len(prod_ids)
+        try:
+            products = {
+                detail["id"]: detail for detail in await self.fetch(prod_ids, city)
+            }
+        except Exception as e:
+            for prod_id in prod_ids:
+                future = self._inflight.pop((prod_id, city), None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        for prod_id in prod_ids:
+            detail = products.get(prod_id)
+            if detail is not None:
+                self.cache.set((prod_id, city), detail)
+            future = self._inflight.pop((prod_id, city), None)
+            if future is not None and not future.done():
+                future.set_result(detail)
+
+    def _run_in_background(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._on_background_done)
+
+    def _on_background_done(self, task: asyncio.Task) -> None:
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Не удалось обновить кэш продуктов: %r", task.exception())
+
+    def invalidate(
+        self, prod_ids: Iterable[int] | None = None, city: str | None = None
+    ) -> int:
+        # без ID сбрасываем весь кэш, без города - записи по всем городам
+        if prod_ids is None:
+            removed = len(self.cache)
+            self.cache.clear()
+            return removed
+        prod_ids = set(prod_ids)
+        keys = [
+            key
+            for key in self.cache.keys()
+            if key[0] in prod_ids and (city is None or key[1] == city)
+        ]
+        return self.cache.invalidate(keys)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "batches_sent": self.batches_sent,
+            "ids_requested": self.ids_requested,
+            "coalesced": self.coalesced,
+        }
+
+
+product_loader = ProductLoader(
+    http_manager=shop_http_manager,
+    cache=TTLCache(
+        maxsize=settings.api_shop.product_cache_maxsize,
+        ttl=settings.api_shop.product_cache_ttl,
+        stale_ttl=settings.api_shop.product_cache_stale_ttl,
+    ),
+    batch_window=settings.api_shop.product_batch_window_ms / 1000,
+    max_batch_size=settings.api_shop.product_batch_max_size,
+)
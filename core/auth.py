@@ -0,0 +1,27 @@
+from dataclasses import dataclass, field
+
+import jwt
+
+from core.jwt_verifier import jwt_verifier
+from core.settings import settings
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    # пользователь, от имени которого пришел запрос
+    user_id: str
+    payload: dict = field(repr=False)
+
+
+def decode_principal(token: str) -> Principal:
+    # ValueError, если ключ невалидный, не access или без user_id
+    try:
+        payload = jwt_verifier.decode(token)
+    except jwt.PyJWTError:
+        raise ValueError("Не валидный ключ!")
+    if payload.get("type") != settings.auth_jwt.allowed_key_type:
+        raise ValueError("Не валидный ключ!")
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise ValueError("Ключ не сожержит полезных данных.")
+    return Principal(user_id=user_id, payload=payload)
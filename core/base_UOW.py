@@ -1,8 +1,12 @@
 from abc import ABC, abstractmethod
 
-from basket_app.bascket_repository import BascketRepository
+from basket_app.bascket_repository import BascketRepository, BasketItemRepository
 from core.db_manager import db_manager
-from order_app.order_repository import OrderRepository, TransactionPaymentRepository
+from order_app.order_repository import (
+    OrderRepository,
+    PaymentLinkOutboxRepository,
+    TransactionPaymentRepository,
+)
 
 
 class IUnitOfWork(ABC):
@@ -31,8 +35,10 @@ class UnitOfWork:
         self.session = self.session_factory()
         # для работы
         self.bascket = BascketRepository(self.session)
+        self.bascket_items = BasketItemRepository(self.session)
         self.order = OrderRepository(self.session)
         self.payment = TransactionPaymentRepository(self.session)
+        self.payment_link_outbox = PaymentLinkOutboxRepository(self.session)
 
     async def __aexit__(self, *args):
         await self.session.close()
@@ -45,6 +45,26 @@ class SQLAlchemyRepository(AbstractRepository):
         res = result.scalars().all()
         return res
 
+    async def get_objs_after_id(self, after_id: int | None, limit: int):
+        # keyset пагинация по id: без OFFSET, глубина страницы не важна
+        stmt = select(self.model).order_by(self.model.id).limit(limit)
+        if after_id is not None:
+            stmt = stmt.where(self.model.id > after_id)
+        result: Result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def stream_obj_partitions(self, yield_per: int):
+        # серверный курсор: в памяти не больше yield_per строк за раз,
+        # отдаем пачками - дочерние данные можно догрузить на всю пачку
+        stmt = (
+            select(self.model)
+            .order_by(self.model.id)
+            .execution_options(yield_per=yield_per)
+        )
+        result = await self.session.stream_scalars(stmt)
+        async for partition in result.partitions():
+            yield list(partition)
+
     async def get_obj(self, **filter_by):
         stmt = select(self.model).filter_by(**filter_by)
         try:
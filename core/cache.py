@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Iterable
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    value: Any
+    # до этого момента значение свежее
+    expires_at: float
+    # до этого момента значение можно отдавать, параллельно обновляя его
+    stale_until: float
+
+    def is_fresh(self, now: float | None = None) -> bool:
+        return (time.monotonic() if now is None else now) < self.expires_at
+
+
+class TTLCache:
+    """LRU кэш в памяти процесса с TTL на каждую запись.
+
+    После истечения ttl запись еще stale_ttl секунд отдается как "несвежая"
+    (stale-while-revalidate), решение об обновлении принимает вызывающий код.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float = 0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and time.monotonic() < entry.stale_until
+
+    def get_entry(self, key: Hashable) -> CacheEntry | None:
+        entry = self._data.get(key)
+        now = time.monotonic()
+        if entry is None or now >= entry.stale_until:
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        if entry.is_fresh(now):
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.get_entry(key)
+        return default if entry is None else entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        self._data[key] = CacheEntry(
+            value=value,
+            expires_at=now + ttl,
+            stale_until=now + ttl + self.stale_ttl,
+        )
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def keys(self) -> list[Hashable]:
+        return list(self._data)
+
+    def invalidate(self, keys: Iterable[Hashable]) -> int:
+        removed = 0
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                removed += 1
+        return removed
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        keys = [key for key, entry in self._data.items() if predicate(key, entry.value)]
+        return self.invalidate(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,87 @@
+import time
+
+
+class CircuitOpenError(Exception):
+    """Внешний сервис считается недоступным, запрос не отправлялся."""
+
+
+class CircuitBreaker:
+    """Предохранитель для вызовов внешнего сервиса.
+
+    closed - запросы идут; после failure_threshold ошибок подряд - open:
+    запросы сразу отклоняются. Через recovery_timeout - half_open:
+    пропускаем один пробный запрос, успех закрывает предохранитель,
+    ошибка снова открывает.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        # время старта пробного запроса в half_open (None - пробы нет)
+        self._trial_started_at: float | None = None
+        self.consecutive_failures = 0
+        self.failures = 0
+        self.successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if (
+            self._state == self.OPEN
+            and time.monotonic() >= self._opened_at + self.recovery_timeout
+        ):
+            return self.HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            now = time.monotonic()
+            # проба, которая так и не закончилась, не должна держать предохранитель
+            if (
+                self._trial_started_at is None
+                or now >= self._trial_started_at + self.recovery_timeout
+            ):
+                self._trial_started_at = now
+                return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.successes += 1
+        self.consecutive_failures = 0
+        self._state = self.CLOSED
+        self._trial_started_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        state = self.state
+        if (
+            state == self.HALF_OPEN
+            or self.consecutive_failures >= self.failure_threshold
+        ):
+            if state != self.OPEN:
+                self.opened += 1
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._trial_started_at = None
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failures": self.failures,
+            "successes": self.successes,
+            "rejected": self.rejected,
+            "opened": self.opened,
+        }
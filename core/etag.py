@@ -0,0 +1,32 @@
+from fastapi import HTTPException, status
+
+
+def make_etag(*parts) -> str:
+    # сильный ETag: "id.version"
+    return '"' + ".".join(map(str, parts)) + '"'
+
+
+def parse_etags(header: str | None) -> set[str]:
+    # If-Match / If-None-Match: список через запятую или "*"
+    if not header:
+        return set()
+    return {tag.strip() for tag in header.split(",") if tag.strip()}
+
+
+def if_none_match(header: str | None, etag: str) -> bool:
+    # для If-None-Match сравнение слабое: W/"x" совпадает с "x"
+    tags = parse_etags(header)
+    return "*" in tags or etag in {tag.removeprefix("W/") for tag in tags}
+
+
+def check_if_match(header: str | None, etag: str | None) -> None:
+    # для If-Match сравнение строгое; etag=None - ресурса нет
+    if header is None:
+        return
+    tags = parse_etags(header)
+    if etag is not None and ("*" in tags or etag in tags):
+        return
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="Корзина изменилась, перечитай ее (If-Match не совпал).",
+    )
@@ -0,0 +1,73 @@
+import httpx
+
+from core.settings import settings
+
+
+class HttpClientManager:
+    """Один пул keep-alive соединений на процесс.
+
+    Клиент создается в lifespan приложения (start/close), но при обращении
+    вне lifespan (скрипты, миграции) создается лениво.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        connect_timeout: float,
+        read_timeout: float,
+        http2: bool = False,
+    ) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(
+            read_timeout,
+            connect=connect_timeout,
+            pool=connect_timeout,
+        )
+        self.http2 = http2
+        self._client: httpx.AsyncClient | None = None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=self.limits,
+            timeout=self.timeout,
+            http2=self.http2,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def start(self) -> None:
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+shop_http_manager = HttpClientManager(
+    max_connections=settings.api_shop.max_connections,
+    max_keepalive_connections=settings.api_shop.max_keepalive_connections,
+    keepalive_expiry=settings.api_shop.keepalive_expiry,
+    connect_timeout=settings.api_shop.connect_timeout,
+    read_timeout=settings.api_shop.read_timeout,
+    http2=settings.api_shop.http2,
+)
+
+bank_http_manager = HttpClientManager(
+    max_connections=settings.api_bank.max_connections,
+    max_keepalive_connections=settings.api_bank.max_keepalive_connections,
+    keepalive_expiry=settings.api_bank.keepalive_expiry,
+    connect_timeout=settings.api_bank.connect_timeout,
+    read_timeout=settings.api_bank.read_timeout,
+)
@@ -0,0 +1,75 @@
+import hashlib
+import time
+
+import jwt
+
+from core.cache import TTLCache
+from core.key_set import KeySet, key_set
+from core.settings import settings
+
+
+class JWTVerifier:
+    """Проверка JWT без лишней работы на каждый запрос.
+
+    Ключи берутся из KeySet уже разобранными, по kid из заголовка токена.
+    Проверенные токены хранятся в кэше (ключ - sha256 токена) до их exp,
+    повторная проверка подписи для них не нужна. Токены без exp и
+    невалидные токены не кэшируются. Если ключ удален или заменен -
+    проверенные им токены выкидываются из кэша.
+    """
+
+    def __init__(
+        self,
+        key_set: KeySet,
+        algorithm: str,
+        default_kid: str,
+        cache_maxsize: int,
+    ) -> None:
+        self.key_set = key_set
+        self.algorithm = algorithm
+        self.default_kid = default_kid
+        # значение - (kid, payload)
+        self.cache = TTLCache(maxsize=cache_maxsize, ttl=0)
+        key_set.on_removed(self.invalidate_kids)
+
+    @staticmethod
+    def _cache_key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def decode(self, token: str) -> dict:
+        # бросает jwt.PyJWTError, как и jwt.decode
+        cache_key = self._cache_key(token)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return dict(cached[1])
+        kid = jwt.get_unverified_header(token).get("kid") or self.default_kid
+        key = self.key_set.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Неизвестный kid {kid!r}")
+        payload = jwt.decode(token, key, algorithms=[self.algorithm])
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            ttl = exp - time.time()
+            if ttl > 0:
+                self.cache.set(cache_key, (kid, payload), ttl=ttl)
+        # копия: вызывающий код не должен портить закэшированный payload
+        return dict(payload)
+
+    def invalidate_kids(self, kids: set[str]) -> int:
+        if not kids:
+            return 0
+        return self.cache.invalidate_where(lambda _, value: value[0] in kids)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+jwt_verifier = JWTVerifier(
+    key_set=key_set,
+    algorithm=settings.auth_jwt.algorithm,
+    default_kid=settings.auth_jwt.default_kid,
+    cache_maxsize=settings.auth_jwt.verified_cache_maxsize,
+)
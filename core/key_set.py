@@ -0,0 +1,157 @@
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable
+
+import jwt
+
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class KeySet:
+    """Публичные ключи для проверки JWT по kid.
+
+    Ключи берутся из *.pem в certs_dir (kid - имя файла без расширения) и из
+    JWKS файла, если он задан. Файлы опрашиваются раз в poll_interval секунд;
+    чтение и разбор ключей идут в отдельном потоке, новый набор подменяет
+    старый одним присваиванием. Пока новый набор не разобран (файл
+    дописывается, битый PEM) - работаем со старым.
+
+    Подписчики on_removed узнают kid ключей, которые удалили или заменили.
+    """
+
+    def __init__(
+        self,
+        certs_dir: Path,
+        algorithm: str,
+        jwks_path: Path | None = None,
+        poll_interval: float = 10,
+    ) -> None:
+        self.certs_dir = Path(certs_dir)
+        self.algorithm = algorithm
+        self.jwks_path = None if jwks_path is None else Path(jwks_path)
+        self.poll_interval = poll_interval
+        self._keys: dict[str, Any] = {}
+        # kid -> исходный текст ключа, чтобы заметить замену ключа
+        self._sources: dict[str, str] = {}
+        self._snapshot = None
+        self._listeners: list[Callable[[set[str]], None]] = []
+        self._task: asyncio.Task | None = None
+        self.reloads = 0
+        self.last_error = None
+        # при старте грузим синхронно: первый запрос не ждет ключей
+        self._apply(*self._load())
+
+    def get(self, kid: str) -> Any | None:
+        return self._keys.get(kid)
+
+    def kids(self) -> list[str]:
+        return list(self._keys)
+
+    def on_removed(self, callback: Callable[[set[str]], None]) -> None:
+        self._listeners.append(callback)
+
+    # == блокирующая часть, выполняется в потоке ============================
+    def _files(self) -> list[Path]:
+        files = sorted(self.certs_dir.glob("*.pem")) if self.certs_dir.is_dir() else []
+        if self.jwks_path is not None and self.jwks_path.is_file():
+            files.append(self.jwks_path)
+        return files
+
+    def _take_snapshot(self) -> tuple:
+        snapshot = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            snapshot.append((str(path), stat.st_mtime_ns, stat.st_size))
+        return tuple(snapshot)
+
+    def _load(self) -> tuple[tuple, dict[str, Any], dict[str, str]]:
+        snapshot = self._take_snapshot()
+        algorithm = jwt.get_algorithm_by_name(self.algorithm)
+        keys, sources = {}, {}
+        for path in self._files():
+            if path == self.jwks_path:
+                data = json.loads(path.read_text())
+                for jwk in data.get("keys", []):
+                    kid = jwk.get("kid")
+                    if kid is None:
+                        continue
+                    keys[kid] = jwt.PyJWK(jwk, self.algorithm).key
+                    sources[kid] = json.dumps(jwk, sort_keys=True)
+            else:
+                pem = path.read_text()
+                keys[path.stem] = algorithm.prepare_key(pem)
+                sources[path.stem] = pem
+        if not keys:
+            raise ValueError(f"Нет ни одного ключа в {self.certs_dir}")
+        return snapshot, keys, sources
+
+    # =======================================================================
+    def _apply(
+        self, snapshot: tuple, keys: dict[str, Any], sources: dict[str, str]
+    ) -> set[str]:
+        removed = {
+            kid for kid, source in self._sources.items() if sources.get(kid) != source
+        }
+        self._keys = keys
+        self._sources = sources
+        self._snapshot = snapshot
+        self.reloads += 1
+        for callback in self._listeners:
+            callback(removed)
+        return removed
+
+    async def reload(self, force: bool = False) -> bool:
+        snapshot = await asyncio.to_thread(self._take_snapshot)
+        if not force and snapshot == self._snapshot:
+            return False
+        removed = self._apply(*await asyncio.to_thread(self._load))
+        logger.info("Ключи JWT перечитаны: %s, удалены: %s", self.kids(), removed)
+        return True
+
+    async def run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.reload()
+                self.last_error = None
+            except Exception as e:
+                # одну и ту же ошибку на каждом опросе не повторяем в логе
+                if repr(e) != self.last_error:
+                    logger.warning("Не удалось перечитать ключи JWT: %r", e)
+                self.last_error = repr(e)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "kids": self.kids(),
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+        }
+
+
+key_set = KeySet(
+    certs_dir=settings.auth_jwt.certs_dir,
+    algorithm=settings.auth_jwt.algorithm,
+    jwks_path=settings.auth_jwt.jwks_path,
+    poll_interval=settings.auth_jwt.keys_poll_interval,
+)
@@ -0,0 +1,78 @@
+import base64
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Generic, TypeVar
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+# как считать total страницы
+class CountMode(str, Enum):
+    # точный COUNT(*) на каждый запрос
+    EXACT = "EXACT"
+    # из кэша по фильтру или оценка планировщика, может отставать
+    APPROXIMATE = "APPROXIMATE"
+    # без total
+    NONE = "NONE"
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: list[T]
+    size: int
+    # непрозрачный курсор следующей страницы, None - страниц больше нет
+    next_cursor: str | None = None
+    # None - total не запрашивали (count=NONE)
+    total: int | None = None
+    total_approximate: bool = False
+
+
+def encode_cursor(*values) -> str:
+    # значения ключа последней записи страницы -> строка для клиента
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        values = None
+    if not isinstance(values, list) or len(values) != length:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Невалидный курсор.",
+        )
+    return values
+
+
+def decode_id_cursor(cursor: str) -> int:
+    # ключ id - для выдачи в порядке id
+    (obj_id,) = decode_cursor(cursor, 1)
+    try:
+        return int(obj_id)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Невалидный курсор.",
+        )
+
+
+def encode_created_at_cursor(obj) -> str:
+    # ключ (created_at, id) - для выдачи в порядке создания
+    return encode_cursor(obj.created_at.isoformat(), obj.id)
+
+
+def decode_created_at_cursor(cursor: str) -> tuple[datetime, int]:
+    created_at, obj_id = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(created_at), int(obj_id)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Невалидный курсор.",
+        )
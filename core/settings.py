@@ -43,10 +43,55 @@ class SettingsDataBase(BaseModel):
 
 
 class SettingsAuth(BaseModel):
-    public_key_path: Path = BASE_DIR / "certs" / "public.pem"
-    public_key: str = public_key_path.read_text()
+    # публичные ключи *.pem, kid ключа - имя файла (public.pem -> "public")
+    certs_dir: Path = Path(os.getenv("JWT_CERTS_DIR", BASE_DIR / "certs"))
+    # необязательный JWKS файл, его ключи добавляются к ключам из certs_dir
+    jwks_path: Path | None = os.getenv("JWT_JWKS_PATH") or None
+    # каким ключом проверять токены без kid в заголовке
+    default_kid: str = os.getenv("JWT_DEFAULT_KID", "public")
+    # как часто проверять, не поменялись ли файлы ключей, секунды
+    keys_poll_interval: float = float(os.getenv("JWT_KEYS_POLL_INTERVAL", 10))
     algorithm: str = "RS256"
     allowed_key_type: str = "access_token"
+    # сколько проверенных токенов держать в кэше (каждый - до своего exp)
+    verified_cache_maxsize: int = int(os.getenv("JWT_CACHE_MAXSIZE", 10000))
+
+
+class SettingsBasket(BaseModel):
+    # дублировать состав корзины в JSON колонке baskets.basket_items
+    # (источник истины - таблица basketitems)
+    items_json_cache: bool = (
+        os.getenv("BASKET_ITEMS_JSON_CACHE", "true").lower() == "true"
+    )
+    # постраничная выдача корзин
+    page_size: int = int(os.getenv("BASKET_PAGE_SIZE", 50))
+    max_page_size: int = int(os.getenv("BASKET_MAX_PAGE_SIZE", 500))
+    # сколько строк за раз тянуть с серверного курсора при выгрузке
+    export_yield_per: int = int(os.getenv("BASKET_EXPORT_YIELD_PER", 1000))
+    # максимум uuid_id в одном пакетном чтении
+    batch_max_size: int = int(os.getenv("BASKET_BATCH_MAX_SIZE", 500))
+
+    # =================================================================
+    # сборщик брошенных корзин (completed=False, без заказов)
+    gc_enabled: bool = os.getenv("BASKET_GC_ENABLED", "false").lower() == "true"
+    # через сколько дней без изменений корзина считается брошенной
+    gc_idle_days: int = int(os.getenv("BASKET_GC_IDLE_DAYS", 30))
+    # сколько корзин удаляем одной транзакцией
+    gc_batch_size: int = int(os.getenv("BASKET_GC_BATCH_SIZE", 500))
+    # пауза между пачками, секунды
+    gc_batch_pause: float = float(os.getenv("BASKET_GC_BATCH_PAUSE", 0.5))
+    # как часто запускать сборку, секунды
+    gc_interval: float = float(os.getenv("BASKET_GC_INTERVAL", 3600))
+
+
+class SettingsOrder(BaseModel):
+    # постраничная выдача ордеров (keyset по created_at, id)
+    page_size: int = int(os.getenv("ORDER_PAGE_SIZE", 50))
+    max_page_size: int = int(os.getenv("ORDER_MAX_PAGE_SIZE", 500))
+    # приблизительный total (count=APPROXIMATE): сколько секунд держим
+    # число ордеров по фильтру и сколько разных фильтров помним
+    count_cache_ttl: float = float(os.getenv("ORDER_COUNT_CACHE_TTL", 60))
+    count_cache_maxsize: int = int(os.getenv("ORDER_COUNT_CACHE_MAXSIZE", 10000))
 
 
 class SettingsCORSMiddleware(BaseModel):
@@ -68,6 +113,27 @@ class SettingsApiShop(BaseModel):
     )
     url_api_prod_detail: HttpUrl = "{host}api/v1/products/{prod_slug}/"
 
+    # =================================================================
+    # пул соединений к API магазина (один клиент на процесс)
+    max_connections: int = int(os.getenv("SHOP_MAX_CONNECTIONS", 100))
+    max_keepalive_connections: int = int(os.getenv("SHOP_MAX_KEEPALIVE", 20))
+    keepalive_expiry: float = float(os.getenv("SHOP_KEEPALIVE_EXPIRY", 30))
+    # для HTTP/2 нужен пакет h2 (httpx[http2])
+    http2: bool = os.getenv("SHOP_HTTP2", "false").lower() == "true"
+    connect_timeout: float = float(os.getenv("SHOP_CONNECT_TIMEOUT", 3))
+    read_timeout: float = float(os.getenv("SHOP_READ_TIMEOUT", 10))
+
+    # =================================================================
+    # кэш деталей продуктов (ключ - prod_id и город)
+    product_cache_maxsize: int = int(os.getenv("PRODUCT_CACHE_MAXSIZE", 10000))
+    product_cache_ttl: float = float(os.getenv("PRODUCT_CACHE_TTL", 60))
+    # сколько еще секунд после ttl отдаем старое значение, обновляя его в фоне
+    product_cache_stale_ttl: float = float(os.getenv("PRODUCT_CACHE_STALE_TTL", 300))
+    # окно, за которое промахи параллельных запросов собираются в один запрос
+    product_batch_window_ms: float = float(os.getenv("PRODUCT_BATCH_WINDOW_MS", 5))
+    # максимум ID в одном запросе (ограничение на длину URL)
+    product_batch_max_size: int = int(os.getenv("PRODUCT_BATCH_MAX_SIZE", 200))
+
     def _format_url(self, template: str, **kwargs) -> HttpUrl:
         defaults = {"host": self.host_addr_api}
         data = {**defaults, **kwargs}
@@ -101,6 +167,42 @@ class SettingsApiBank(BaseModel):
     password: str = os.getenv("PASSWORD")
     client_id: str = os.getenv("CLIENT_ID")
     client_secret: str = os.getenv("CLIENT_SECRET")
+    # токен считаем протухшим за столько секунд до expires_in
+    token_expiry_margin: float = float(os.getenv("BANK_TOKEN_EXPIRY_MARGIN", 60))
+    # за столько секунд до протухания токен обновляется в фоне
+    token_refresh_ahead: float = float(os.getenv("BANK_TOKEN_REFRESH_AHEAD", 300))
+    # если банк не прислал expires_in
+    token_default_ttl: float = float(os.getenv("BANK_TOKEN_DEFAULT_TTL", 600))
+
+    # =================================================================
+    # пул соединений к банку (один клиент на процесс)
+    max_connections: int = int(os.getenv("BANK_MAX_CONNECTIONS", 20))
+    max_keepalive_connections: int = int(os.getenv("BANK_MAX_KEEPALIVE", 10))
+    keepalive_expiry: float = float(os.getenv("BANK_KEEPALIVE_EXPIRY", 30))
+    connect_timeout: float = float(os.getenv("BANK_CONNECT_TIMEOUT", 3))
+    read_timeout: float = float(os.getenv("BANK_READ_TIMEOUT", 15))
+    # повторы: всего попыток и backoff (full jitter) между ними, секунды
+    retry_attempts: int = int(os.getenv("BANK_RETRY_ATTEMPTS", 3))
+    retry_backoff: float = float(os.getenv("BANK_RETRY_BACKOFF", 0.2))
+    retry_backoff_max: float = float(os.getenv("BANK_RETRY_BACKOFF_MAX", 2))
+    # предохранитель: после скольких ошибок подряд перестаем ходить в банк
+    # и через сколько секунд пробуем снова
+    breaker_failure_threshold: int = int(os.getenv("BANK_BREAKER_THRESHOLD", 5))
+    breaker_recovery_timeout: float = float(os.getenv("BANK_BREAKER_RECOVERY", 30))
+
+    # =================================================================
+    # outbox платежных ссылок: ссылку получает фоновый диспетчер
+    # сколько задач забирать за раз и сколько запросов в банк параллельно
+    outbox_batch_size: int = int(os.getenv("PAYMENT_OUTBOX_BATCH_SIZE", 20))
+    outbox_concurrency: int = int(os.getenv("PAYMENT_OUTBOX_CONCURRENCY", 10))
+    # как часто смотреть в таблицу, если никто не разбудил, секунды
+    outbox_poll_interval: float = float(os.getenv("PAYMENT_OUTBOX_POLL_INTERVAL", 1))
+    # после стольких неудач отдаем self_link_redirect_not_successful
+    outbox_max_attempts: int = int(os.getenv("PAYMENT_OUTBOX_MAX_ATTEMPTS", 5))
+    # на сколько секунд задача закрепляется за диспетчером
+    outbox_lease: float = float(os.getenv("PAYMENT_OUTBOX_LEASE", 60))
+    # сколько create_order ждет ссылку, прежде чем отдать страницу заказа
+    payment_link_wait: float = float(os.getenv("PAYMENT_LINK_WAIT", 10))
 
     # =================================================================
     # статическая часть данных для "полезной нагрузки" для получения конкретной ссылки на оплату
@@ -152,6 +254,10 @@ class Settings(BaseSettings):
 
     # == DataBase
     db: SettingsDataBase = SettingsDataBase()
+    # == Basket
+    basket: SettingsBasket = SettingsBasket()
+    # == Order
+    order: SettingsOrder = SettingsOrder()
     # == Auth
     auth_jwt: SettingsAuth = SettingsAuth()
     # == CORSMiddleware
@@ -1,7 +1,6 @@
 #!/usr/bin/env sh
 
 echo "------- alembic block -------"
-python -m alembic revision --autogenerate -m 'init'
 python -m alembic upgrade head 
 echo "------- alembic block end -------"
 echo "------- ------- 5 ------- -------"
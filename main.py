@@ -1,13 +1,39 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 
 from fastapi import FastAPI
 
+from basket_app.basket_gc import basket_gc
+from core.http_client import bank_http_manager, shop_http_manager
+from core.key_set import key_set
 from core.settings import settings
+from order_app.payment_link_dispatcher import payment_link_dispatcher
 
 from api_v1 import router as router_v1
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # общие пулы соединений к API магазина и банка
+    await shop_http_manager.start()
+    await bank_http_manager.start()
+    # перечитывание ключей JWT при ротации
+    key_set.start()
+    # фоновая сборка брошенных корзин
+    if settings.basket.gc_enabled:
+        basket_gc.start()
+    # получение платежных ссылок по outbox
+    payment_link_dispatcher.start()
+    yield
+    await payment_link_dispatcher.stop()
+    await basket_gc.stop()
+    await key_set.stop()
+    await shop_http_manager.close()
+    await bank_http_manager.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(**settings.middleware.middleware)
 
@@ -0,0 +1,75 @@
+import asyncio
+from collections import deque
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from order_app.models import account_number_seq
+
+
+# Postgres: начало и размер нового блока вместе с уже занятыми в нем номерами.
+# nextval в CTE вычисляется один раз; занятых нет - одна строка с NULL.
+# :name явно приводим к text, иначе asyncpg выводит для него два разных типа
+RESERVE_BLOCK_PG_SQL = """
+WITH block AS (
+    SELECT nextval(CAST(CAST(:name AS text) AS regclass)) AS hi, increment_by AS size
+    FROM pg_sequences
+    WHERE schemaname = current_schema() AND sequencename = CAST(:name AS text)
+)
+SELECT block.hi, block.size, orders.account_number
+FROM block
+LEFT JOIN orders
+    ON orders.account_number BETWEEN block.hi AND block.hi + block.size - 1
+"""
+
+
+class AccountNumberAllocator:
+    """Номера счетов для банка без коллизий и повторов create_order.
+
+    Postgres: hi-lo поверх account_number_seq. nextval выдает начало блока,
+    шаг последовательности - размер блока (его берем из БД, а не из кода);
+    номера блока раздаются из памяти процесса, в БД идем раз на блок.
+    Номера блока, уже занятые старыми случайными счетами, выкидываются
+    тем же походом - отдельной проверки на каждый заказ нет.
+
+    Для других БД next() возвращает None - остается default модели.
+    """
+
+    def __init__(self, sequence_name: str) -> None:
+        self.sequence_name = sequence_name
+        self._free: deque[int] = deque()
+        self._lock = asyncio.Lock()
+        # метрики
+        self.blocks = 0
+        self.skipped = 0
+
+    async def next(self, session: AsyncSession) -> int | None:
+        if session.get_bind().dialect.name != "postgresql":
+            return None
+        async with self._lock:
+            while not self._free:
+                await self._reserve_block(session)
+            return self._free.popleft()
+
+    async def _reserve_block(self, session: AsyncSession) -> None:
+        # nextval не откатывается вместе с транзакцией: блок наш в любом случае
+        res = await session.execute(
+            text(RESERVE_BLOCK_PG_SQL), {"name": self.sequence_name}
+        )
+        rows = res.all()
+        hi, block_size = rows[0].hi, rows[0].size
+        lo = hi + block_size - 1
+        taken = {row.account_number for row in rows if row.account_number is not None}
+        self._free.extend(n for n in range(hi, lo + 1) if n not in taken)
+        self.blocks += 1
+        self.skipped += len(taken)
+
+    def stats(self) -> dict:
+        return {
+            "blocks": self.blocks,
+            "skipped": self.skipped,
+            "free_in_block": len(self._free),
+        }
+
+
+account_number_allocator = AccountNumberAllocator(account_number_seq.name)
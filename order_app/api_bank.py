@@ -1,9 +1,26 @@
+import asyncio
+import logging
+import random
+import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, asdict
+from typing import Awaitable, Callable
 
-from httpx import Request, AsyncClient, HTTPError
+from httpx import (
+    ConnectError,
+    ConnectTimeout,
+    HTTPError,
+    HTTPStatusError,
+    PoolTimeout,
+    Request,
+    Response,
+)
 
 from core import settings
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from core.http_client import bank_http_manager
+
+logger = logging.getLogger(__name__)
 
 
 # Интерфейс для обработчиков типов данных
@@ -37,9 +54,93 @@ class FormUrlEncodedRequestHandler(RequestHandler):
         return request
 
 
+class BankTokenManager:
+    """OAuth токен банка в памяти процесса.
+
+    Токен живет до expires_in - expiry_margin. За refresh_ahead секунд до
+    этого он обновляется в фоне, а запросы продолжают получать текущий.
+    Обновление всегда одно: параллельные заказы ждут общий запрос.
+    """
+
+    def __init__(
+        self,
+        fetch_token: Callable[[], Awaitable[dict]],
+        expiry_margin: float,
+        refresh_ahead: float,
+        default_ttl: float,
+    ) -> None:
+        self.fetch_token = fetch_token
+        self.expiry_margin = expiry_margin
+        self.refresh_ahead = refresh_ahead
+        self.default_ttl = default_ttl
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._refresh_task: asyncio.Task | None = None
+        self.refreshes = 0
+        self.failures = 0
+
+    async def get(self) -> str:
+        now = time.monotonic()
+        if self._token is not None and now < self._expires_at:
+            if now >= self._refresh_at:
+                self._start_refresh()
+            return self._token
+        # shield: отмена одного заказа не отменяет общее обновление
+        return await asyncio.shield(self._start_refresh())
+
+    def invalidate(self) -> None:
+        # банк отверг токен - следующий get() получит новый
+        self._token = None
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+            self._refresh_task.add_done_callback(self._on_refresh_done)
+        return self._refresh_task
+
+    async def _refresh(self) -> str:
+        response_data = await self.fetch_token()
+        token = response_data.get("access_token")
+        if not token:
+            raise ValueError("Нет ключа доступа для проведения оплаты.")
+        ttl = float(response_data.get("expires_in") or self.default_ttl)
+        now = time.monotonic()
+        self._token = token
+        self._expires_at = now + max(ttl - self.expiry_margin, 0)
+        self._refresh_at = max(self._expires_at - self.refresh_ahead, now)
+        self.refreshes += 1
+        return token
+
+    def _on_refresh_done(self, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is None:
+            return
+        self.failures += 1
+        # фоновое обновление никто не ждет - хотя бы в лог
+        logger.warning("Не удалось обновить токен банка: %r", task.exception())
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "has_token": self._token is not None and now < self._expires_at,
+            "expires_in": max(self._expires_at - now, 0) if self._token else 0,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+
+# запрос до банка не дошел - повторять можно любой запрос
+NOT_SENT_ERRORS = (ConnectError, ConnectTimeout, PoolTimeout)
+
+
 class ApiPayBank:
     auth_url = settings.api_bank.auth_url
     pay_link_url = settings.api_bank.pay_link_url
+    breaker = CircuitBreaker(
+        failure_threshold=settings.api_bank.breaker_failure_threshold,
+        recovery_timeout=settings.api_bank.breaker_recovery_timeout,
+    )
+    retries = 0
 
     @dataclass
     class TokenAtr:
@@ -78,37 +179,114 @@ class ApiPayBank:
         back_link: str = settings.api_bank.back_link
         failure_back_link: str = settings.api_bank.failure_back_link
 
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        # full jitter: повторы разных воркеров не бьют в банк одновременно
+        cap = min(
+            settings.api_bank.retry_backoff * 2 ** (attempt - 1),
+            settings.api_bank.retry_backoff_max,
+        )
+        return random.uniform(0, cap)
+
     @classmethod
-    async def _post_request(cls, url, data, handler: RequestHandler, headers=None):
+    async def _send(
+        cls, url, data, handler: RequestHandler, headers=None, idempotent=False
+    ) -> Response:
+        # idempotent=False - повторяем, только если запрос точно не ушел в банк
+        if not cls.breaker.allow():
+            raise CircuitOpenError("Банк недоступен, запросы временно не отправляются.")
         headers = headers or {}
-        request = handler.prepare_request(url, headers, data)
-        async with AsyncClient() as client:
+        client = bank_http_manager.client
+        # хотя бы одна попытка, даже если BANK_RETRY_ATTEMPTS <= 0
+        attempts = max(1, settings.api_bank.retry_attempts)
+        for attempt in range(1, attempts + 1):
+            request = handler.prepare_request(url, headers, data)
+            # у запроса, собранного без клиента, нет таймаутов - берем клиентские
+            request.extensions["timeout"] = client.timeout.as_dict()
             try:
                 response = await client.send(request)
-                return response.json()
+                if response.status_code >= 500:
+                    raise HTTPStatusError(
+                        f"Банк ответил {response.status_code}",
+                        request=request,
+                        response=response,
+                    )
             except HTTPError as e:
-                raise ValueError(f"Что же пошло не так..: {str(e)}")
+                retryable = idempotent or isinstance(e, NOT_SENT_ERRORS)
+                if not retryable or attempt == attempts:
+                    cls.breaker.record_failure()
+                    raise ValueError(f"Что же пошло не так..: {str(e)}")
+                cls.retries += 1
+                await asyncio.sleep(cls._backoff(attempt))
+                continue
+            cls.breaker.record_success()
+            return response
 
     @classmethod
-    async def get_token(cls):
+    async def _post_request(
+        cls, url, data, handler: RequestHandler, headers=None, idempotent=False
+    ):
+        response = await cls._send(url, data, handler, headers, idempotent)
+        return response.json()
+
+    @classmethod
+    async def fetch_token(cls) -> dict:
         payload_data = asdict(cls.TokenAtr())
-        response_data = await cls._post_request(
-            url=cls.auth_url, data=payload_data, handler=FormUrlEncodedRequestHandler()
+        # получение токена ничего не меняет в банке - можно повторять
+        return await cls._post_request(
+            url=cls.auth_url,
+            data=payload_data,
+            handler=FormUrlEncodedRequestHandler(),
+            idempotent=True,
         )
-        token = response_data.get("access_token")
-        if not token:
-            raise ValueError("Нет ключа доступа для проведения оплаты.")
-        return token
+
+    @classmethod
+    async def get_token(cls):
+        # из кэша; в банк только когда токен подходит к концу
+        return await cls.token_manager.get()
 
     @classmethod
     async def create_payment_link(cls, **data):
+        try:
+            invoice_url = await cls.request_payment_link(**data)
+        except CircuitOpenError:
+            return settings.api_bank.self_link_redirect_not_successful
+        return invoice_url or settings.api_bank.self_link_redirect_not_successful
+
+    @classmethod
+    async def request_payment_link(cls, **data) -> str | None:
+        # без подмены на запасную ссылку: CircuitOpenError / ValueError наружу
+        payload_data = asdict(cls.JsonPayload(**data))
+        response = await cls._send_payment_link(payload_data)
+        if response.status_code == 401:
+            # токен отозван раньше expires_in - берем новый и пробуем еще раз
+            cls.token_manager.invalidate()
+            response = await cls._send_payment_link(payload_data)
+        return response.json().get("invoice_url")
+
+    @classmethod
+    async def _send_payment_link(cls, payload_data: dict) -> Response:
         token = await cls.get_token()
         authorization_headers = asdict(cls.AuthorizationHeader(token))
-        payload_data = asdict(cls.JsonPayload(**data))
-        response_data = await cls._post_request(
+        return await cls._send(
             url=cls.pay_link_url,
             data=payload_data,
             headers=authorization_headers,
             handler=JsonRequestHandler(),
         )
-        return response_data.get("invoice_url")
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            "token": cls.token_manager.stats(),
+            "breaker": cls.breaker.stats(),
+            "retries": cls.retries,
+        }
+
+
+ApiPayBank.token_manager = BankTokenManager(
+    fetch_token=ApiPayBank.fetch_token,
+    expiry_margin=settings.api_bank.token_expiry_margin,
+    refresh_ahead=settings.api_bank.token_refresh_ahead,
+    default_ttl=settings.api_bank.token_default_ttl,
+)
@@ -3,16 +3,45 @@ from random import randint
 from datetime import datetime
 
 from sqlalchemy import Enum as SQLEnum
-from sqlalchemy import ForeignKey, Text, DECIMAL, Integer, TIMESTAMP, UUID
+from sqlalchemy import ForeignKey, Index, Sequence, Text, DECIMAL, Integer
+from sqlalchemy import TIMESTAMP, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 # from sqlalchemy.dialects.postgresql import JSON
 
 from core import Base
-from order_app.schemas import DeliveryType, OrderStatusType, PaymentType, PaymentStatus
+from core.base_model import get_current_time
+from order_app.schemas import (
+    DeliveryType,
+    OrderStatusType,
+    PaymentLinkStatus,
+    PaymentType,
+    PaymentStatus,
+)
+
+
+# номера счетов блоками (hi-lo): nextval - начало блока, шаг - размер блока
+account_number_seq = Sequence(
+    "orders_account_number_seq",
+    start=100000000,
+    increment=100,
+    minvalue=100000000,
+    maxvalue=999999999,
+    metadata=Base.metadata,
+)
 
 
 class Order(Base):
+    __table_args__ = (
+        # keyset выдача ордеров: /order/all/ и архив менеджера
+        Index("ix_orders_order_status_created_at", "order_status", "created_at", "id"),
+        Index(
+            "ix_orders_manager_executive_id_created_at",
+            "manager_executive_id",
+            "created_at",
+            "id",
+        ),
+    )
     # ФИО пользователя, который создал заказ
     user_full_name: Mapped[str] = mapped_column(
         nullable=False,
@@ -27,7 +56,8 @@ class Order(Base):
         nullable=False,
         default=0.0,
     )
-    # Номер счета для банка, автоматически генерируется
+    # Номер счета для банка, 9 цифр. На Postgres его выдает
+    # AccountNumberAllocator из account_number_seq, случайный - для остальных БД
     account_number: Mapped[int] = mapped_column(
         Integer,
         nullable=False,
@@ -100,6 +130,15 @@ class Order(Base):
         return str(self)
 
 
+# история ордеров пользователя, новые сначала (/order/by_access_t/)
+Index(
+    "ix_orders_user_id_created_at",
+    Order.user_id,
+    Order.created_at.desc(),
+    Order.id.desc(),
+)
+
+
 # куда ж ты городишь это...
 class TransactionPayment(Base):
     account_id: Mapped[str] = mapped_column(nullable=False)
@@ -142,3 +181,39 @@ class TransactionPayment(Base):
 
     def __repr__(self):
         return str(self)
+
+
+# outbox: заказ коммитится сразу, а ссылку на оплату получает фоновый диспетчер
+class PaymentLinkOutbox(Base):
+    __table_args__ = (
+        # выборка задач, которые пора отправлять
+        Index(
+            "ix_paymentlinkoutboxs_status_next_attempt_at", "status", "next_attempt_at"
+        ),
+    )
+    order_id: Mapped[int] = mapped_column(
+        ForeignKey("orders.id", ondelete="CASCADE"),
+        unique=True,
+        nullable=False,
+    )
+    status: Mapped[PaymentLinkStatus] = mapped_column(
+        SQLEnum(PaymentLinkStatus),
+        nullable=False,
+        default=PaymentLinkStatus.PENDING,
+    )
+    # сколько раз уже ходили в банк
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    # когда задачу можно брать (повтор после ошибки или истекшая аренда)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True),
+        nullable=False,
+        default=get_current_time,
+    )
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    order: Mapped["Order"] = relationship("Order")
+
+    def __str__(self):
+        return f"PaymentLinkOutbox order_id={self.order_id}, status={self.status})"
+
+    def __repr__(self):
+        return str(self)
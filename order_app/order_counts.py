@@ -0,0 +1,54 @@
+from core.base_UOW import IUnitOfWork
+from core.cache import TTLCache
+from core.settings import settings
+
+
+class OrderCountCache:
+    """Приблизительное число ордеров по фильтру для total страниц.
+
+    Значение живет ttl секунд. Промах: на Postgres - оценка планировщика
+    (без чтения строк), на других БД - точный COUNT(*). Изменения, которые
+    делает этот сервис (новый ордер), сразу поправляют закэшированные
+    числа через adjust; статусы, которые меняются снаружи, догонит ttl.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def _key(filter_by: dict) -> tuple:
+        # Enum и строка с тем же значением - один ключ
+        return tuple(
+            sorted(
+                (key, str(getattr(value, "value", value)))
+                for key, value in filter_by.items()
+            )
+        )
+
+    async def get(self, uow: IUnitOfWork, **filter_by) -> int:
+        key = self._key(filter_by)
+        count = self.cache.get(key)
+        if count is None:
+            count = await uow.order.estimate_count(**filter_by)
+            if count is None:
+                count = await uow.order.count_objs(**filter_by)
+            self.cache.set(key, count)
+        return count
+
+    def adjust(self, delta: int, **filter_by) -> None:
+        # только поправка уже закэшированного числа, срок жизни не продлеваем
+        entry = self.cache.get_entry(self._key(filter_by))
+        if entry is not None:
+            entry.value = max(entry.value + delta, 0)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+order_count_cache = OrderCountCache(
+    maxsize=settings.order.count_cache_maxsize,
+    ttl=settings.order.count_cache_ttl,
+)
@@ -1,10 +1,17 @@
+import json
 from datetime import datetime, timezone, timedelta
+from decimal import Decimal
 
-from sqlalchemy import select, insert
-from sqlalchemy.orm import joinedload
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import bindparam, exists, func, select, insert, text, tuple_, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError, NoResultFound
 
-from order_app.models import Order, TransactionPayment
+from basket_app.models import Basket
+from basket_app.schemas import CheckoutStageSchema
+from order_app.account_number_allocator import account_number_allocator
+from order_app.models import Order, PaymentLinkOutbox, TransactionPayment
+from order_app.schemas import PaymentCallbackResult, PaymentLinkStatus, PaymentStatus
+from core.base_model import get_current_time
 from core.base_repository import SQLAlchemyRepository
 
 
@@ -16,38 +23,313 @@ class TransactionPaymentRepository(SQLAlchemyRepository):
         res = await self.session.execute(stmt)
         return res.scalar_one()
 
+    async def apply_callback(self, data: dict) -> PaymentCallbackResult:
+        # транзакция, статус ордера и закрытие корзины; повтор по reference
+        # ничего не меняет. С ордером сверяем точную сумму, в
+        # transactionpayments.amount колонка целая
+        amount = data["amount"]
+        data = {**data, "amount": int(amount)}
+        if self.session.get_bind().dialect.name == "postgresql":
+            return await self._apply_callback_pg(data, amount)
+        return await self._apply_callback_batched(data, amount)
+
+    async def _apply_callback_pg(
+        self, data: dict, amount: Decimal
+    ) -> PaymentCallbackResult:
+        # один запрос: цепочка CTE, каждая следующая ступень работает только
+        # со строками, которые вернула предыдущая
+        columns = self.model.__table__.c
+        # в CTE у каждого параметра свое имя: иначе updated_at трех
+        # INSERT/UPDATE сливаются в один параметр
+        now = get_current_time()
+        data = {**data, "created_at": now, "updated_at": now}
+        matched_order = (
+            select(Order.account_number)
+            .where(
+                Order.account_number == data["invoice_id"],
+                Order.total_amount == amount,
+            )
+            .cte("matched_order")
+        )
+        inserted = (
+            postgresql.insert(self.model)
+            .from_select(
+                list(data),
+                select(
+                    *(
+                        bindparam(f"p_{key}", value, type_=columns[key].type)
+                        for key, value in data.items()
+                    )
+                ).select_from(matched_order),
+            )
+            .on_conflict_do_nothing(index_elements=[self.model.reference])
+            .returning(self.model.invoice_id)
+            .cte("inserted_payment")
+        )
+        paid_order = (
+            update(Order)
+            .where(Order.account_number == inserted.c.invoice_id)
+            .values(
+                payment_status=PaymentStatus.PAID,
+                updated_at=bindparam("order_updated_at", now),
+            )
+            .returning(Order.uuid_id, Order.user_id)
+            .cte("paid_order")
+        )
+        closed_basket = (
+            update(Basket)
+            .where(
+                Basket.uuid_id == paid_order.c.uuid_id,
+                Basket.completed.is_(False),
+                Basket.checkout_stage == CheckoutStageSchema.IN_PROGRESS,
+            )
+            .values(
+                completed=True,
+                user_id=paid_order.c.user_id,
+                version=Basket.version + 1,
+                updated_at=bindparam("basket_updated_at", now),
+            )
+            .returning(Basket.id)
+            .cte("closed_basket")
+        )
+        stmt = select(
+            select(func.count()).select_from(paid_order).scalar_subquery(),
+            select(func.count()).select_from(closed_basket).scalar_subquery(),
+            select(func.count()).select_from(matched_order).scalar_subquery(),
+            exists().where(Order.account_number == data["invoice_id"]),
+        )
+        res = await self.session.execute(stmt)
+        paid, _, matched, order_exists = res.one()
+        if paid:
+            return PaymentCallbackResult.APPLIED
+        if matched:
+            return PaymentCallbackResult.REPLAY
+        if order_exists:
+            return PaymentCallbackResult.AMOUNT_MISMATCH
+        return PaymentCallbackResult.NO_ORDER
+
+    async def _apply_callback_batched(
+        self, data: dict, amount: Decimal
+    ) -> PaymentCallbackResult:
+        # без CTE с DML: ордер и признак повтора одним SELECT,
+        # изменения - в той же транзакции
+        res = await self.session.execute(
+            select(Order.total_amount, Order.uuid_id, Order.user_id, self.model.id)
+            .outerjoin(self.model, self.model.reference == data["reference"])
+            .where(Order.account_number == data["invoice_id"])
+        )
+        row = res.first()
+        if row is None:
+            return PaymentCallbackResult.NO_ORDER
+        total_amount, uuid_id, user_id, payment_id = row
+        if payment_id is not None:
+            return PaymentCallbackResult.REPLAY
+        if total_amount != amount:
+            return PaymentCallbackResult.AMOUNT_MISMATCH
+        # первым - UPDATE ордера: он открывает транзакцию и берет блокировку
+        # на запись, параллельный повтор ждет здесь. SAVEPOINT первым
+        # оператором SQLite считает отдельной транзакцией и коммитит сразу
+        await self.session.execute(
+            update(Order)
+            .where(Order.account_number == data["invoice_id"])
+            .values(payment_status=PaymentStatus.PAID)
+        )
+        try:
+            await self.session.execute(insert(self.model).values(**data))
+        except IntegrityError:
+            # параллельный повтор успел раньше - откатываем и отметку ордера
+            await self.session.rollback()
+            return PaymentCallbackResult.REPLAY
+        await self.session.execute(
+            update(Basket)
+            .where(
+                Basket.uuid_id == uuid_id,
+                Basket.completed.is_(False),
+                Basket.checkout_stage == CheckoutStageSchema.IN_PROGRESS,
+            )
+            .values(completed=True, user_id=user_id, version=Basket.version + 1)
+        )
+        return PaymentCallbackResult.APPLIED
+
+
+class PaymentLinkOutboxRepository(SQLAlchemyRepository):
+    model = PaymentLinkOutbox
+
+    async def claim_due(
+        self, limit: int, lease: timedelta
+    ) -> list[tuple[PaymentLinkOutbox, Order]]:
+        # забираем задачи, которые пора отправлять, и "арендуем" их на lease:
+        # другие воркеры их не возьмут, пока аренда не истечет
+        now = get_current_time()
+        stmt = (
+            select(self.model, Order)
+            .join(Order, Order.id == self.model.order_id)
+            .where(
+                self.model.status == PaymentLinkStatus.PENDING,
+                self.model.next_attempt_at <= now,
+            )
+            .order_by(self.model.next_attempt_at)
+            .limit(limit)
+            .with_for_update(of=self.model, skip_locked=True)
+        )
+        res = await self.session.execute(stmt)
+        claimed = res.tuples().all()
+        for outbox, _ in claimed:
+            outbox.attempts += 1
+            outbox.next_attempt_at = now + lease
+        return claimed
+
+    async def finish(
+        self,
+        outbox_id: int,
+        order_id: int,
+        status: PaymentLinkStatus,
+        payment_link: str,
+        error: str | None = None,
+    ) -> None:
+        await self.session.execute(
+            update(self.model)
+            .where(self.model.id == outbox_id)
+            .values(status=status, last_error=error)
+        )
+        await self.session.execute(
+            update(Order).where(Order.id == order_id).values(payment_link=payment_link)
+        )
+
+    async def reschedule(
+        self, outbox_id: int, next_attempt_at: datetime, error: str
+    ) -> None:
+        await self.session.execute(
+            update(self.model)
+            .where(self.model.id == outbox_id)
+            .values(next_attempt_at=next_attempt_at, last_error=error)
+        )
+
 
 class OrderRepository(SQLAlchemyRepository):
     model = Order
 
-    def get_query_orders(self, order_status):
-        return (
+    async def create_obj(self, data: dict):
+        if "account_number" not in data:
+            account_number = await account_number_allocator.next(self.session)
+            if account_number is not None:
+                data = {**data, "account_number": account_number}
+        return await super().create_obj(data)
+
+    async def get_objs_after(
+        self, after: tuple[datetime, int] | None, limit: int, **filter_by
+    ):
+        # keyset по (created_at, id): страница читается по индексу
+        # (фильтр, created_at) без OFFSET, глубина страницы не важна
+        stmt = (
             select(self.model)
-            .where(self.model.order_status == order_status)
-            .order_by(self.model.created_at)
+            .filter_by(**filter_by)
+            .order_by(self.model.created_at, self.model.id)
+            .limit(limit)
         )
+        if after is not None:
+            stmt = stmt.where(
+                tuple_(self.model.created_at, self.model.id) > tuple_(*after)
+            )
+        res = await self.session.execute(stmt)
+        return res.scalars().all()
+
+    async def count_objs(self, **filter_by) -> int:
+        stmt = select(func.count()).select_from(self.model).filter_by(**filter_by)
+        res = await self.session.execute(stmt)
+        return res.scalar_one()
+
+    async def estimate_count(self, **filter_by) -> int | None:
+        # оценка планировщика Postgres: без чтения строк, по статистике
+        # таблицы; None - оценки нет (другая БД)
+        if self.session.get_bind().dialect.name != "postgresql":
+            return None
+        stmt = select(self.model.id).filter_by(**filter_by)
+        # EXPLAIN не принимает параметры отдельно - значения фильтра
+        # подставляет и экранирует диалект
+        sql = stmt.compile(
+            dialect=self.session.get_bind().dialect,
+            compile_kwargs={"literal_binds": True},
+        )
+        res = await self.session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+        plan = res.scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    # корзина без JSON состава: он нужен только с include=basket_items
+    basket_info_columns = (
+        Basket.id,
+        Basket.uuid_id,
+        Basket.user_id,
+        Basket.completed,
+        Basket.checkout_stage,
+        Basket.version,
+        Basket.created_at,
+        Basket.updated_at,
+    )
 
     async def get_info_order_with_basket(self, uuid_id: str):
+        # строка (колонки ордера, колонки корзины с префиксом basket_) -
+        # без ORM объектов; последний ордер корзины
         stmt = (
-            select(Order)
-            .options(joinedload(Order.basket))  # Загрузка связанных данных корзины
-            .filter(Order.uuid_id == uuid_id)
+            select(
+                *self.model.__table__.c,
+                *(
+                    column.label(f"basket_{column.key}")
+                    for column in self.basket_info_columns
+                ),
+            )
+            .outerjoin(Basket, Basket.uuid_id == self.model.uuid_id)
+            .where(self.model.uuid_id == uuid_id)
+            .order_by(self.model.id.desc())
+            .limit(1)
         )
         res = await self.session.execute(stmt)
-        return res.scalar_one()
+        return res.mappings().one()
 
-    def get_objs_by_filters(self, **filter_by):
-        stmt = select(self.model).filter_by(**filter_by).order_by(self.model.created_at)
-        return stmt
-
-    async def get_objs_to_user_id(self, user_id: str):
+    async def get_last_by_uuid(self, uuid_id: str) -> Order | None:
+        # последний ордер корзины
         stmt = (
             select(self.model)
-            .filter_by(user_id=user_id)
-            .order_by(self.model.created_at)
+            .filter_by(uuid_id=uuid_id)
+            .order_by(self.model.id.desc())
+            .limit(1)
         )
         res = await self.session.execute(stmt)
-        return res.scalars().all()
+        return res.scalars().first()
+
+    # колонки OrderSummaryPydantic
+    summary_columns = (
+        Order.id,
+        Order.uuid_id,
+        Order.account_number,
+        Order.created_at,
+        Order.order_status,
+        Order.payment_type,
+        Order.payment_status,
+        Order.delivery_type,
+        Order.shipping_city,
+        Order.total_amount,
+    )
+
+    async def get_summaries_by_user(
+        self, user_id: str, before: tuple[datetime, int] | None, limit: int
+    ):
+        # новые сначала, keyset по индексу (user_id, created_at DESC, id DESC);
+        # только нужные колонки - строки, а не ORM объекты
+        stmt = (
+            select(*self.summary_columns)
+            .where(self.model.user_id == user_id)
+            .order_by(self.model.created_at.desc(), self.model.id.desc())
+            .limit(limit)
+        )
+        if before is not None:
+            stmt = stmt.where(
+                tuple_(self.model.created_at, self.model.id) < tuple_(*before)
+            )
+        res = await self.session.execute(stmt)
+        return res.all()
 
     async def get_obj(
         self,
@@ -5,26 +5,39 @@ from sqlalchemy.exc import IntegrityError, NoResultFound
 # == My
 from core import settings
 from core.base_UOW import IUnitOfWork
-from core.base_utils import get_total_sum_per_basket
-from order_app.api_bank import ApiPayBank
-from order_app.models import Order, TransactionPayment
-from basket_app.models import Basket
+from order_app.payment_link_dispatcher import payment_link_dispatcher
+from order_app.pricing_service import PricingService
+from order_app.models import Order
+from order_app.order_counts import order_count_cache
+from basket_app.bascket_service import BascketService
 from order_app.schemas import (
     OrderStatusType,
     OrderCreateSchema,
+    OrderInclude,
+    OrderPydantic,
+    OrderSummaryPydantic,
+    OrderWithBasketPydantic,
+    ReadOrderPydantic,
     PaymentType,
-    PaymentStatus,
     BankCallbackModel,
+    QuotePydantic,
+    PaymentLinkPydantic,
+    PaymentCallbackResult,
 )
 from basket_app.schemas import CheckoutStageSchema
 
-from fastapi_pagination import Page, Params
-from fastapi_pagination.ext.sqlalchemy import paginate
+from core.pagination import (
+    CountMode,
+    CursorPage,
+    decode_created_at_cursor,
+    encode_created_at_cursor,
+)
 
 
 class OrdertService:
     async def create_order(self, uow: IUnitOfWork, new_order: OrderCreateSchema):
-        comment = new_order.comment or "=)"
+        # ссылку на оплату получает payment_link_dispatcher уже после коммита:
+        # транзакции короткие, соединение с БД не ждет ни магазин, ни банк
         try:
             async with uow:
                 basket = await uow.bascket.get_obj(
@@ -34,15 +47,26 @@ class OrdertService:
                     raise ValueError(
                         "Нет корзины. Возможно, она уже оформлена 'completed=True'"
                     )
-                total_sum = get_total_sum_per_basket(
-                    shipping_city=new_order.shipping_city,
-                    basket_items=basket.basket_items,
-                )
-                user_id = new_order.access_token.model_dump().get("access_token")
-                order_dict = new_order.model_dump(exclude=["access_token"])
-                order_dict["user_id"] = user_id.get("user_id", None)
-                order_dict["total_amount"] = total_sum
+                await BascketService().attach_items(uow, [basket])
+            total_sum = await PricingService().get_total_sum(
+                shipping_city=new_order.shipping_city,
+                basket_items=basket.basket_items,
+            )
+            user_id = new_order.access_token.model_dump().get("access_token")
+            order_dict = new_order.model_dump(exclude=["access_token"])
+            order_dict["user_id"] = user_id.get("user_id", None)
+            order_dict["total_amount"] = total_sum
 
+            async with uow:
+                # корзину блокируем: параллельный create_order ждет здесь
+                # и потом находит уже созданный ордер
+                basket = await uow.bascket.get_obj_for_update(
+                    uuid_id=new_order.uuid_id, completed=False
+                )
+                if basket is None:
+                    raise ValueError(
+                        "Нет корзины. Возможно, она уже оформлена 'completed=True'"
+                    )
                 order: Order = await uow.order.get_obj(
                     max_age_days=settings.api_bank.expire_period,
                     user_id=order_dict["user_id"],
@@ -50,26 +74,18 @@ class OrdertService:
                     phone_number=new_order.phone_number,
                     email=new_order.email,
                 )
-                if order:
-                    return order.payment_link
-                else:
+                if order is None:
+                    if new_order.payment_type != PaymentType.ONLINE:
+                        order_dict["payment_link"] = (
+                            settings.api_bank.self_link_order_dateil
+                        )
                     order: Order = await uow.order.create_obj(order_dict)
-                    basket.checkout_stage = CheckoutStageSchema.IN_PROGRESS
                     if new_order.payment_type == PaymentType.ONLINE:
-                        payment_link = await ApiPayBank.create_payment_link(
-                            invoice_id=str(order.account_number),
-                            amount=int(order.total_amount),
-                            description=comment,
-                            recipient_contact=order.email,
-                            recipient_contact_sms=order.phone_number,
-                            notifier_contact_sms=order.phone_number,
-                        )
-                    else:
-                        payment_link = settings.api_bank.self_link_order_dateil
-                    order.payment_link = payment_link
-
-                await uow.commit()
-                return payment_link
+                        await uow.payment_link_outbox.create_obj({"order_id": order.id})
+                    basket.checkout_stage = CheckoutStageSchema.IN_PROGRESS
+                    await uow.commit()
+                    order_count_cache.adjust(1, order_status=order.order_status)
+                order_id, payment_link = order.id, order.payment_link
 
         except IntegrityError:
             raise HTTPException(
@@ -87,89 +103,182 @@ class OrdertService:
                 detail=f"Для корзины {new_order.uuid_id!r} нарушена структура.\n err: {e}",
             )
 
-    async def get_orders_by_user_id(self, uow: IUnitOfWork, user_id: str):
+        if payment_link is not None:
+            return payment_link
+        payment_link_dispatcher.notify()
+        payment_link = await payment_link_dispatcher.wait_for_link(
+            order_id, timeout=settings.api_bank.payment_link_wait
+        )
+        # банк не успел - отдаем страницу заказа, ссылка будет в
+        # GET /order/payment_link/{uuid_id}/
+        return payment_link or settings.api_bank.self_link_order_dateil
+
+    async def get_payment_link(
+        self, uow: IUnitOfWork, uuid_id: str, wait: float = 0
+    ) -> PaymentLinkPydantic:
+        async with uow:
+            order: Order = await uow.order.get_last_by_uuid(uuid_id=uuid_id)
+        if order is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Нет заказа для корзины {uuid_id!r}.",
+            )
+        payment_link = order.payment_link
+        if payment_link is None and wait > 0:
+            payment_link = await payment_link_dispatcher.wait_for_link(
+                order.id, timeout=wait
+            )
+        return PaymentLinkPydantic(
+            account_number=order.account_number,
+            payment_link=payment_link,
+            ready=payment_link is not None,
+        )
+
+    async def get_quote(
+        self, uow: IUnitOfWork, uuid_id: str, shipping_city: str
+    ) -> QuotePydantic:
+        async with uow:
+            basket = await uow.bascket.get_obj(uuid_id=uuid_id, completed=False)
+            if basket is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Корзина с UUID {uuid_id!r} не найдена.",
+                )
+            await BascketService().attach_items(uow, [basket])
+        try:
+            return await PricingService().quote(
+                shipping_city=shipping_city, basket_items=basket.basket_items
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Для корзины {uuid_id!r} нарушена структура.\n err: {e}",
+            )
+
+    async def get_orders_by_user_id(
+        self, uow: IUnitOfWork, user_id: str, size: int, cursor: str | None = None
+    ) -> CursorPage[OrderSummaryPydantic]:
+        before = decode_created_at_cursor(cursor) if cursor else None
         async with uow:
-            orders = await uow.order.get_objs_to_user_id(user_id=user_id)
-            return orders
+            # +1 запись, чтобы понять, есть ли следующая страница
+            rows = await uow.order.get_summaries_by_user(user_id, before, size + 1)
+        has_next = len(rows) > size
+        rows = rows[:size]
+        return CursorPage[OrderSummaryPydantic](
+            items=[OrderSummaryPydantic.model_validate(row) for row in rows],
+            size=size,
+            next_cursor=encode_created_at_cursor(rows[-1]) if has_next else None,
+        )
 
-    async def get_info_order_with_basket(self, uow: IUnitOfWork, uuid_id: str):
+    async def get_user_order(
+        self, uow: IUnitOfWork, user_id: str, order_id: int
+    ) -> ReadOrderPydantic:
         async with uow:
-            res = await uow.order.get_info_order_with_basket(uuid_id=uuid_id)
-            return res
+            order = await uow.order.get_obj(id=order_id, user_id=user_id)
+        if order is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Ордер {order_id!r} не найден.",
+            )
+        return ReadOrderPydantic.model_validate(order, from_attributes=True)
 
-    async def get_paginated_orders(
-        self, uow: IUnitOfWork, params: Params, order_status: OrderStatusType
-    ) -> Page:
+    async def get_info_order_with_basket(
+        self, uow: IUnitOfWork, uuid_id: str, include: OrderInclude | None = None
+    ) -> OrderWithBasketPydantic:
+        # NoResultFound - наружу, ручка отвечает 404
         async with uow:
-            query = uow.order.get_query_orders(
-                order_status
-            )  # Получаем базовый запрос на объекты Order
-            result = await paginate(uow.session, query, params)
-            return result
+            row = await uow.order.get_info_order_with_basket(uuid_id=uuid_id)
+            order, basket = {}, {}
+            for key, value in row.items():
+                if key.startswith("basket_"):
+                    basket[key.removeprefix("basket_")] = value
+                else:
+                    order[key] = value
+            if basket["id"] is None:
+                basket = None
+            elif include == "basket_items":
+                # состав - тем же путем, что и в API корзин (basketitems / JSON)
+                baskets = await uow.bascket.get_objs_by_uuids(
+                    [uuid_id], fields=["id", "basket_items", "gift_items"]
+                )
+                baskets = await BascketService().attach_items(uow, baskets)
+        if basket is not None and include == "basket_items":
+            await BascketService().attach_item_details(baskets)
+            if baskets:
+                basket["basket_items"] = baskets[0].basket_items
+                basket["gift_items"] = baskets[0].gift_items
+        return OrderWithBasketPydantic.model_validate({**order, "basket": basket})
+
+    async def get_paginated_orders(
+        self,
+        uow: IUnitOfWork,
+        size: int,
+        order_status: OrderStatusType,
+        cursor: str | None = None,
+        count: CountMode = CountMode.NONE,
+    ) -> CursorPage[OrderPydantic]:
+        return await self._get_orders_page(
+            uow, OrderPydantic, size, cursor, count, order_status=order_status
+        )
 
     async def get_paginated_orders_by_filters(
-        self, uow: IUnitOfWork, params: Params, **kwargs
-    ) -> Page:
+        self,
+        uow: IUnitOfWork,
+        size: int,
+        cursor: str | None = None,
+        count: CountMode = CountMode.NONE,
+        **kwargs,
+    ) -> CursorPage[ReadOrderPydantic]:
+        return await self._get_orders_page(
+            uow, ReadOrderPydantic, size, cursor, count, **kwargs
+        )
+
+    async def _get_orders_page(
+        self,
+        uow: IUnitOfWork,
+        schema,
+        size: int,
+        cursor: str | None,
+        count: CountMode,
+        **filter_by,
+    ) -> CursorPage:
+        after = decode_created_at_cursor(cursor) if cursor else None
+        total = None
         async with uow:
-            query = uow.order.get_objs_by_filters(**kwargs)
-            result = await paginate(uow.session, query, params)
-            return result
+            # +1 запись, чтобы понять, есть ли следующая страница
+            orders = await uow.order.get_objs_after(after, size + 1, **filter_by)
+            if count == CountMode.EXACT:
+                total = await uow.order.count_objs(**filter_by)
+            elif count == CountMode.APPROXIMATE:
+                total = await order_count_cache.get(uow, **filter_by)
+        has_next = len(orders) > size
+        orders = orders[:size]
+        return CursorPage[schema](
+            items=[
+                schema.model_validate(order, from_attributes=True) for order in orders
+            ],
+            size=size,
+            next_cursor=encode_created_at_cursor(orders[-1]) if has_next else None,
+            total=total,
+            total_approximate=count == CountMode.APPROXIMATE,
+        )
 
     async def accepting_payment(self, uow: IUnitOfWork, new_payment: BankCallbackModel):
-        try:
-            new_payment_dict = new_payment.model_dump()
-            invoice_id = int(new_payment_dict.get("invoice_id"))
-            new_payment_dict["invoice_id"] = invoice_id
-
-            async with uow:
-                payment: TransactionPayment = await uow.payment.create_obj_pay(
-                    account_id=new_payment.account_id,
-                    amount=new_payment.amount,
-                    approval_code=new_payment.approval_code,
-                    card_id=new_payment.card_id,
-                    card_mask=new_payment.card_mask,
-                    card_type=new_payment.card_type,
-                    code=new_payment.code,
-                    currency=new_payment.currency,
-                    date_time=new_payment.date_time,
-                    description=new_payment.description,
-                    email=new_payment.email,
-                    ip=new_payment.ip,
-                    ip_city=new_payment.ip_city,
-                    ip_country=new_payment.ip_country,
-                    ip_district=new_payment.ip_district,
-                    ip_latitude=new_payment.ip_latitude,
-                    ip_longitude=new_payment.ip_longitude,
-                    ip_region=new_payment.ip_region,
-                    issuer=new_payment.issuer,
-                    language=new_payment.language,
-                    name=new_payment.name,
-                    phone=new_payment.phone,
-                    reason=new_payment.reason,
-                    reason_code=new_payment.reason_code,
-                    reference=new_payment.reference,
-                    secure=new_payment.secure,
-                    secure_details=new_payment.secure_details,
-                    terminal=new_payment.terminal,
-                    invoice_id=int(new_payment.invoice_id),
-                )
-                order: Order = await uow.order.get_obj(
-                    account_number=int(new_payment.invoice_id)
+        # банк повторяет колбэки пачками: повтор с тем же reference - успех
+        data = new_payment.model_dump(exclude={"id"})
+        data["invoice_id"] = int(new_payment.invoice_id)
+        async with uow:
+            result = await uow.payment.apply_callback(data)
+            if result == PaymentCallbackResult.NO_ORDER:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Нет ордера с номером счета {new_payment.invoice_id!r}.",
                 )
-                basket: Basket = await uow.bascket.update_ob_pay(
-                    uuid_id=order.uuid_id,
-                    data={"completed": True, "user_id": order.user_id},
+            if result == PaymentCallbackResult.AMOUNT_MISMATCH:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Платеж не соотвествует сумме ордера.",
                 )
-                if order.total_amount != payment.amount:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Платеж не соотвествует сумме ордера.",
-                    )
-                order.payment_status = PaymentStatus.PAID
+            if result == PaymentCallbackResult.APPLIED:
                 await uow.commit()
-            return None
-        except IntegrityError:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Упсс ... ограничения базы данных.",
-            )
+        return None
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import random
+from datetime import timedelta
+
+from core import settings
+from core.base_model import get_current_time
+from core.base_UOW import UnitOfWork
+from order_app.api_bank import ApiPayBank
+from order_app.models import Order, PaymentLinkOutbox
+from order_app.schemas import PaymentLinkStatus
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentLinkDispatcher:
+    """Фоновое получение платежных ссылок по задачам из outbox.
+
+    create_order только коммитит ордер и задачу, в банк ходит диспетчер:
+    забирает пачку задач короткой транзакцией (с арендой на lease секунд),
+    запрашивает ссылки параллельно (не больше concurrency запросов) уже без
+    соединения с БД, и записывает результат второй короткой транзакцией.
+
+    Ждущие ссылку (wait_for_link) будятся сразу, в этом же процессе; если
+    задачу взял другой воркер - ссылку увидят при очередной проверке БД.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        concurrency: int,
+        poll_interval: float,
+        max_attempts: int,
+        lease: float,
+    ) -> None:
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        # order_id -> ожидающие ссылку
+        self._waiters: dict[int, set[asyncio.Future]] = {}
+        self._task: asyncio.Task | None = None
+        # метрики
+        self.dispatched = 0
+        self.retried = 0
+        self.failed = 0
+
+    def notify(self) -> None:
+        # появилась новая задача - не ждем poll_interval
+        self._wakeup.set()
+
+    async def dispatch_once(self) -> int:
+        uow = UnitOfWork()
+        async with uow:
+            claimed = await uow.payment_link_outbox.claim_due(
+                limit=self.batch_size, lease=timedelta(seconds=self.lease)
+            )
+            await uow.commit()
+        await asyncio.gather(
+            *(self._dispatch(outbox, order) for outbox, order in claimed)
+        )
+        return len(claimed)
+
+    async def _dispatch(self, outbox: PaymentLinkOutbox, order: Order) -> None:
+        async with self._semaphore:
+            try:
+                payment_link = await ApiPayBank.request_payment_link(
+                    invoice_id=str(order.account_number),
+                    amount=int(order.total_amount),
+                    description=order.comment or "=)",
+                    recipient_contact=order.email,
+                    recipient_contact_sms=order.phone_number,
+                    notifier_contact_sms=order.phone_number,
+                )
+                if not payment_link:
+                    raise ValueError("В ответе банка нет invoice_url.")
+            except Exception as e:
+                await self._on_error(outbox, order, e)
+                return
+        await self._finish(outbox, order, PaymentLinkStatus.DONE, payment_link)
+        self.dispatched += 1
+
+    async def _on_error(
+        self, outbox: PaymentLinkOutbox, order: Order, error: Exception
+    ) -> None:
+        logger.warning(
+            "Ссылка для ордера %s не получена (попытка %s): %r",
+            order.id,
+            outbox.attempts,
+            error,
+        )
+        if outbox.attempts >= self.max_attempts:
+            self.failed += 1
+            await self._finish(
+                outbox,
+                order,
+                PaymentLinkStatus.FAILED,
+                settings.api_bank.self_link_redirect_not_successful,
+                error=repr(error),
+            )
+            return
+        self.retried += 1
+        # backoff с jitter, не дольше аренды
+        delay = random.uniform(0, min(2**outbox.attempts, self.lease))
+        uow = UnitOfWork()
+        async with uow:
+            await uow.payment_link_outbox.reschedule(
+                outbox_id=outbox.id,
+                next_attempt_at=get_current_time() + timedelta(seconds=delay),
+                error=repr(error),
+            )
+            await uow.commit()
+
+    async def _finish(
+        self,
+        outbox: PaymentLinkOutbox,
+        order: Order,
+        status: PaymentLinkStatus,
+        payment_link: str,
+        error: str | None = None,
+    ) -> None:
+        uow = UnitOfWork()
+        async with uow:
+            await uow.payment_link_outbox.finish(
+                outbox_id=outbox.id,
+                order_id=order.id,
+                status=status,
+                payment_link=payment_link,
+                error=error,
+            )
+            await uow.commit()
+        for future in self._waiters.pop(order.id, ()):
+            if not future.done():
+                future.set_result(payment_link)
+
+    async def wait_for_link(self, order_id: int, timeout: float) -> str | None:
+        # long-poll: ссылка или None, если за timeout не появилась
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            uow = UnitOfWork()
+            async with uow:
+                order = await uow.order.get_obj(id=order_id)
+            if order is None or order.payment_link is not None:
+                return None if order is None else order.payment_link
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            future = loop.create_future()
+            waiters = self._waiters.setdefault(order_id, set())
+            waiters.add(future)
+            try:
+                return await asyncio.wait_for(
+                    future, timeout=min(remaining, self.poll_interval)
+                )
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                waiters.discard(future)
+                if not waiters and self._waiters.get(order_id) is waiters:
+                    del self._waiters[order_id]
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                claimed = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Диспетчер платежных ссылок завершился с ошибкой")
+                claimed = 0
+            if claimed >= self.batch_size:
+                # задачи еще есть - сразу за следующей пачкой
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "dispatched": self.dispatched,
+            "retried": self.retried,
+            "failed": self.failed,
+            "waiting_orders": len(self._waiters),
+        }
+
+
+payment_link_dispatcher = PaymentLinkDispatcher(
+    batch_size=settings.api_bank.outbox_batch_size,
+    concurrency=settings.api_bank.outbox_concurrency,
+    poll_interval=settings.api_bank.outbox_poll_interval,
+    max_attempts=settings.api_bank.outbox_max_attempts,
+    lease=settings.api_bank.outbox_lease,
+)
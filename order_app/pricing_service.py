@@ -0,0 +1,68 @@
+from decimal import Decimal
+
+import httpx
+
+from basket_app.utils import basket_item_counts
+from core.api_shop import ProductLoader, product_loader
+from order_app.schemas import QuoteItemPydantic, QuotePydantic
+
+
+class PricingService:
+    """Расчет стоимости корзины для города доставки.
+
+    Цены берутся через ProductLoader: общий пул соединений и кэш по
+    (prod_id, город). Для расчета годятся только свежие записи кэша.
+    Ошибки - ValueError с теми же текстами, что были у
+    get_total_sum_per_basket.
+    """
+
+    def __init__(self, loader: ProductLoader = product_loader) -> None:
+        self.loader = loader
+
+    async def quote(
+        self, shipping_city: str, basket_items: list | dict
+    ) -> QuotePydantic:
+        try:
+            # {prod_id: count} - и для списка ID с повторами, и для компактного формата
+            prod_with_count = basket_item_counts(basket_items)
+            products = await self.loader.load_many(
+                prod_with_count, city=shipping_city, allow_stale=False
+            )
+            if prod_with_count and not products:
+                raise ValueError("В данном городе нет этого товара.")
+
+            items = []
+            for prod_id, count in prod_with_count.items():
+                product = products.get(prod_id)
+                if product is None:
+                    continue
+                stock = product.get("stocks").get(shipping_city)
+                if stock is None:
+                    raise ValueError("В данном городе нет этого товара.")
+                price = Decimal(stock.get("price"))
+                items.append(
+                    QuoteItemPydantic(
+                        prod_id=prod_id,
+                        count=count,
+                        price=price,
+                        amount=price * count,
+                    )
+                )
+            return QuotePydantic(
+                shipping_city=shipping_city,
+                items=items,
+                missing=[
+                    prod_id for prod_id in prod_with_count if prod_id not in products
+                ],
+                total=Decimal(sum(item.amount for item in items)),
+            )
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError("Нарушение структуры корзины.")
+        except httpx.ConnectError:
+            raise ValueError("Нет ответа от сервиса.")
+
+    async def get_total_sum(
+        self, shipping_city: str, basket_items: list | dict
+    ) -> Decimal:
+        quote = await self.quote(shipping_city, basket_items)
+        return quote.total
@@ -3,7 +3,7 @@ from uuid import UUID
 from enum import Enum
 from decimal import Decimal
 from datetime import datetime
-from typing import Annotated, Optional, Type
+from typing import Annotated, Literal, Optional, Type
 from pydantic import (
     BaseModel,
     ConfigDict,
@@ -13,6 +13,7 @@ from pydantic import (
     AwareDatetime,
 )
 
+from basket_app.schemas import BasketReadPydantic
 from core import settings
 from core.base_model import TokenSchema
 
@@ -33,6 +34,22 @@ class PaymentStatus(str, Enum):
     UNPAID = "UNPAID"
 
 
+# Состояние задачи на получение платежной ссылки (outbox)
+class PaymentLinkStatus(str, Enum):
+    PENDING = "PENDING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+# Итог обработки обратного вызова банка
+class PaymentCallbackResult(str, Enum):
+    APPLIED = "APPLIED"
+    # reference уже есть - повтор колбэка, ничего не меняем
+    REPLAY = "REPLAY"
+    NO_ORDER = "NO_ORDER"
+    AMOUNT_MISMATCH = "AMOUNT_MISMATCH"
+
+
 class OrderStatusType(str, Enum):
     NEW = "NEW"
     INWORK = "INWORK"
@@ -226,6 +243,42 @@ class ReadOrderPydantic(OrderPydantic):
     updated_at: datetime | None
 
 
+# что можно добавить к ордеру с корзиной (?include=)
+OrderInclude = Literal["basket_items"]
+
+
+# карточка ордера для менеджера: колонки ордера и корзины без состава;
+# basket_items / gift_items - только с include=basket_items
+class OrderWithBasketPydantic(ReadOrderPydantic):
+    id: int
+    user_id: UUID
+    user_full_name: str
+    email: str | None = None
+    account_number: int
+    total_amount: Decimal
+    payment_type: PaymentType
+    payment_status: PaymentStatus
+    payment_link: str | None = None
+    basket: BasketReadPydantic | None = None
+
+
+# строка истории ордеров пользователя: без комментария, адреса и данных
+# менеджера; полный ордер - /order/by_access_t/{order_id}/
+class OrderSummaryPydantic(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    uuid_id: str
+    account_number: int
+    created_at: datetime | None
+    order_status: OrderStatusType
+    payment_type: PaymentType
+    payment_status: PaymentStatus
+    delivery_type: DeliveryType
+    shipping_city: str
+    total_amount: Decimal
+
+
 class BankCallbackModel(BaseModel):
     account_id: Annotated[str, Field(alias="accountId")]
     amount: Annotated[Decimal, Field(gt=0)]
@@ -263,3 +316,25 @@ class BankCallbackModel(BaseModel):
         populate_by_name=True,  # Разрешает доступ к полям по их "нормальному" имени
         from_attributes=True,  # Поддержка создания моделей из объектов
     )
+
+
+class QuoteItemPydantic(BaseModel):
+    prod_id: int
+    count: int
+    price: Decimal
+    amount: Decimal
+
+
+class QuotePydantic(BaseModel):
+    shipping_city: str
+    items: list[QuoteItemPydantic]
+    # продукты корзины, которых магазин не вернул для этого города
+    missing: list[int]
+    total: Decimal
+
+
+class PaymentLinkPydantic(BaseModel):
+    account_number: int
+    # None - ссылка еще не получена от банка
+    payment_link: str | None = None
+    ready: bool
@@ -0,0 +1,121 @@
+import asyncio
+import copy
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from core import Base
+from basket_app.models import Basket
+from basket_app.bascket_repository import BascketRepository, apply_item_operation
+from basket_app.schemas import BasketItemOperationType as Op
+
+
+CONCURRENT_CALLS = 20
+
+
+async def _create_or_update_concurrently(url: str, uuid_id: str) -> int:
+    engine = create_async_engine(url)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    barrier = asyncio.Barrier(CONCURRENT_CALLS)
+
+    async def call(n: int):
+        # у каждого вызова своя сессия и своя транзакция, как у запросов API;
+        # стартуем все разом, когда соединения уже открыты
+        async with session_factory() as session:
+            await session.connection()
+            await barrier.wait()
+            await BascketRepository(session).create_or_update(
+                uuid_id, {"uuid_id": uuid_id, "basket_items": [{"n": n}]}
+            )
+            await session.commit()
+
+    await asyncio.gather(*(call(n) for n in range(CONCURRENT_CALLS)))
+
+    async with session_factory() as session:
+        count = await session.scalar(
+            select(func.count()).select_from(Basket).filter_by(uuid_id=uuid_id)
+        )
+    await engine.dispose()
+    return count
+
+
+def test_concurrent_create_or_update_keeps_one_row(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'baskets.sqlite3'}"
+    count = asyncio.run(_create_or_update_concurrently(url, "same-uuid"))
+    assert count == 1
+
+
+ITEMS = [
+    {"prod_id": 1, "count": 2},
+    {"prod_id": 2, "count": 1, "gift_prod_id": 10},
+    {"prod_id": 3, "count": 1, "gift_prod_id": 11},
+]
+GIFTS = [{"id": 10, "name": "g10"}, {"id": 11, "name": "g11"}]
+COMPACT = {"1": 2, "2": 1}
+
+
+def counts(basket_items: list) -> dict:
+    return {item["prod_id"]: item["count"] for item in basket_items}
+
+
+@pytest.mark.parametrize(
+    "prod_id, operation, value, expected_counts, expected_gift_ids",
+    [
+        (1, Op.INCREMENT, 3, {1: 5, 2: 1, 3: 1}, [10, 11]),
+        (1, Op.INCREMENT, -2, {2: 1, 3: 1}, [10, 11]),
+        (1, Op.SET, 7, {1: 7, 2: 1, 3: 1}, [10, 11]),
+        (1, Op.SET, 0, {2: 1, 3: 1}, [10, 11]),
+        # вместе с позицией уходит и ее подарок
+        (2, Op.REMOVE, 0, {1: 2, 3: 1}, [11]),
+        (2, Op.SET, -1, {1: 2, 3: 1}, [11]),
+        (3, Op.INCREMENT, -1, {1: 2, 2: 1}, [10]),
+        # нового продукта в списке нет: его добавляет сервис с деталями
+        (9, Op.INCREMENT, 1, {1: 2, 2: 1, 3: 1}, [10, 11]),
+        (9, Op.REMOVE, 0, {1: 2, 2: 1, 3: 1}, [10, 11]),
+    ],
+)
+def test_apply_item_operation_list(
+    prod_id, operation, value, expected_counts, expected_gift_ids
+):
+    items, gifts = copy.deepcopy(ITEMS), copy.deepcopy(GIFTS)
+    new_items, new_gifts = apply_item_operation(items, gifts, prod_id, operation, value)
+    assert counts(new_items) == expected_counts
+    assert [gift["id"] for gift in new_gifts] == expected_gift_ids
+    # gift_prod_id и прочие поля позиции сохраняются
+    assert all(
+        item == {**original, "count": item["count"]}
+        for item in new_items
+        for original in ITEMS
+        if original["prod_id"] == item["prod_id"]
+    )
+    # исходные значения (загруженные в сессию) не меняются
+    assert items == ITEMS and gifts == GIFTS
+
+
+@pytest.mark.parametrize(
+    "prod_id, operation, value, expected",
+    [
+        (1, Op.INCREMENT, 1, {"1": 3, "2": 1}),
+        (9, Op.INCREMENT, 2, {"1": 2, "2": 1, "9": 2}),
+        (1, Op.INCREMENT, -2, {"2": 1}),
+        (1, Op.SET, 5, {"1": 5, "2": 1}),
+        (1, Op.SET, 0, {"2": 1}),
+        (2, Op.REMOVE, 0, {"1": 2}),
+        (9, Op.REMOVE, 0, {"1": 2, "2": 1}),
+    ],
+)
+def test_apply_item_operation_compact(prod_id, operation, value, expected):
+    items = dict(COMPACT)
+    new_items, new_gifts = apply_item_operation(items, GIFTS, prod_id, operation, value)
+    assert new_items == expected
+    # в компактном формате подарки не трогаем
+    assert new_gifts == GIFTS
+    assert items == COMPACT
+
+
+def test_apply_item_operation_empty_basket():
+    assert apply_item_operation(None, None, 1, Op.INCREMENT, 1) == ([], [])
@@ -0,0 +1,88 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from core import Base, settings
+from core.api_shop import product_loader
+from core.base_UOW import UnitOfWork
+from basket_app.bascket_service import BascketService
+from basket_app.schemas import (
+    BasketItemOperation,
+    BasketItemOperationType,
+    BasketPydantic,
+    BasketReadPydantic,
+)
+
+
+PRODUCTS = {
+    prod_id: {"id": prod_id, "name_product": f"p{prod_id}", "slug": f"s{prod_id}"}
+    for prod_id in (1, 2, 3, 4)
+}
+
+
+async def fake_load_many(prod_ids, city=None, allow_stale=True):
+    # магазин не нужен: детали продуктов из словаря
+    return {prod_id: PRODUCTS[prod_id] for prod_id in prod_ids if prod_id in PRODUCTS}
+
+
+def without_times(item: dict) -> dict:
+    # время создания/изменения у двух БД разное - не сравниваем
+    return {k: v for k, v in item.items() if k not in ("created_at", "updated_at")}
+
+
+def dump(basket) -> dict:
+    return without_times(BasketReadPydantic.model_validate(basket).model_dump())
+
+
+async def _basket_responses(url: str) -> dict:
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    def uow() -> UnitOfWork:
+        uow = UnitOfWork()
+        uow.session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+        return uow
+
+    service = BascketService()
+    created = await service.create_bascket(
+        uow(),
+        BasketPydantic(
+            uuid_id="u1",
+            basket_items=[
+                {"prod_id": 1, "count": 2},
+                {"prod_id": 2, "count": 1, "gift_prod_id": 3},
+            ],
+        ),
+    )
+    responses = {"create": dump(created)}
+    responses["get"] = dump(await service.get_bascket_by_uuid(uow(), "u1"))
+    page = await service.get_baskets_page(uow(), size=10)
+    responses["page"] = [without_times(item) for item in page.model_dump()["items"]]
+    batch = await service.get_basckets_by_uuids(uow(), ["u1"])
+    responses["batch"] = [without_times(item) for item in batch.items]
+    for operation, prod_id in (
+        (BasketItemOperationType.INCREMENT, 1),
+        (BasketItemOperationType.INCREMENT, 4),
+    ):
+        basket = await service.apply_item_operation(
+            uow(), "u1", prod_id, BasketItemOperation(operation=operation, value=1)
+        )
+        responses[f"{operation.value}_{prod_id}"] = dump(basket)
+    await engine.dispose()
+    return responses
+
+
+def test_basket_response_same_with_and_without_json_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(product_loader, "load_many", fake_load_many)
+    responses = {}
+    for items_json_cache in (True, False):
+        monkeypatch.setattr(settings.basket, "items_json_cache", items_json_cache)
+        url = f"sqlite+aiosqlite:///{tmp_path / f'{items_json_cache}.sqlite3'}"
+        responses[items_json_cache] = asyncio.run(_basket_responses(url))
+
+    assert responses[True] == responses[False]
+    # детали продукта в ответе есть и без JSON кэша
+    item = responses[False]["get"]["basket_items"][0]
+    assert item["prod"] == PRODUCTS[1]
+    assert item["name"] == "p1" and item["slug"] == "s1"
@@ -0,0 +1,153 @@
+import asyncio
+import uuid
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from core import Base
+from core.base_UOW import UnitOfWork
+from basket_app.models import Basket
+from basket_app.schemas import CheckoutStageSchema
+from order_app.models import Order, TransactionPayment
+from order_app.order_repository import TransactionPaymentRepository
+from order_app.order_service import OrdertService
+from order_app.schemas import BankCallbackModel, PaymentCallbackResult, PaymentStatus
+
+
+ACCOUNT_NUMBER = 123456789
+TOTAL_AMOUNT = Decimal("1500.50")
+
+
+def callback(reference: str, amount: Decimal = TOTAL_AMOUNT, invoice_id=None):
+    return BankCallbackModel(
+        accountId="account",
+        amount=amount,
+        approvalCode="000000",
+        cardMask="440043******1234",
+        cardType="VISA",
+        code="ok",
+        currency="KZT",
+        dateTime="2026-10-18T10:00:00+05:00",
+        id=uuid.uuid4(),
+        invoiceId=str(invoice_id or ACCOUNT_NUMBER),
+        ip="127.0.0.1",
+        reason="success",
+        reasonCode=0,
+        reference=reference,
+        secure="yes",
+        terminal="terminal",
+    )
+
+
+async def _prepare(url: str):
+    engine = create_async_engine(url)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as session:
+        session.add(
+            Basket(uuid_id="b1", checkout_stage=CheckoutStageSchema.IN_PROGRESS)
+        )
+        await session.flush()
+        session.add(
+            Order(
+                user_full_name="user",
+                user_id=uuid.uuid4(),
+                total_amount=TOTAL_AMOUNT,
+                account_number=ACCOUNT_NUMBER,
+                uuid_id="b1",
+                phone_number="+77000000000",
+                shipping_city="Астана",
+            )
+        )
+        await session.commit()
+    return engine, session_factory
+
+
+async def _state(session_factory) -> tuple:
+    async with session_factory() as session:
+        payments = await session.scalar(
+            select(func.count()).select_from(TransactionPayment)
+        )
+        order = await session.scalar(select(Order))
+        basket = await session.scalar(select(Basket))
+    return payments, order, basket
+
+
+async def _send_callbacks(url: str) -> tuple:
+    engine, session_factory = await _prepare(url)
+
+    def uow() -> UnitOfWork:
+        uow = UnitOfWork()
+        uow.session_factory = session_factory
+        return uow
+
+    service = OrdertService()
+    errors = []
+    # первый колбэк, его повтор и колбэк с чужой суммой
+    for payment in (
+        callback("ref-1"),
+        callback("ref-1"),
+        callback("ref-2", amount=Decimal("1500.00")),
+        callback("ref-3", invoice_id=987654321),
+    ):
+        try:
+            await service.accepting_payment(uow(), payment)
+        except HTTPException as error:
+            errors.append(error.status_code)
+    state = await _state(session_factory)
+    await engine.dispose()
+    return errors, state
+
+
+def test_callback_applied_once(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'payments.sqlite3'}"
+    errors, (payments, order, basket) = asyncio.run(_send_callbacks(url))
+
+    # повтор - успех без изменений; чужая сумма и неизвестный счет - 400
+    assert errors == [400, 400]
+    assert payments == 1
+    assert order.payment_status == PaymentStatus.PAID
+    assert basket.completed is True
+    assert basket.user_id == order.user_id
+    assert basket.version == 2
+
+
+async def _apply_racing_callbacks(url: str) -> tuple:
+    engine, session_factory = await _prepare(url)
+    data = callback("ref-1").model_dump(exclude={"id"})
+    data["invoice_id"] = ACCOUNT_NUMBER
+    locking = asyncio.Event()
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def on_update(conn, cursor, statement, *args):
+        if statement.startswith("UPDATE orders"):
+            locking.set()
+
+    async with session_factory() as first, session_factory() as second:
+        first_result = await TransactionPaymentRepository(first).apply_callback(data)
+        locking.clear()
+        # второй колбэк прочитал ордер, пока первый не закоммичен, ждет
+        # блокировку и после коммита первого упирается в уникальный reference
+        second_task = asyncio.create_task(
+            TransactionPaymentRepository(second).apply_callback(data)
+        )
+        await locking.wait()
+        await first.commit()
+        second_result = await second_task
+        await second.commit()
+    state = await _state(session_factory)
+    await engine.dispose()
+    return (first_result, second_result), state
+
+
+def test_racing_callback_is_replay(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'payments.sqlite3'}"
+    results, (payments, order, basket) = asyncio.run(_apply_racing_callbacks(url))
+
+    assert results == (PaymentCallbackResult.APPLIED, PaymentCallbackResult.REPLAY)
+    assert payments == 1
+    assert order.payment_status == PaymentStatus.PAID
+    assert basket.version == 2